@@ -0,0 +1,17 @@
+import sys
+
+from PyQt5.QtWidgets import QApplication
+
+from ecosim.simulation import Simulation
+from ecosim.metrics import Metrics, CSVSink
+from ecosim.gui import Window
+
+app = QApplication(sys.argv)
+window = Window()
+metrics = Metrics(CSVSink('misc/ticks.csv', Metrics.tickColumns), CSVSink('misc/rounds.csv', Metrics.roundColumns), keep=False)
+simulation = Simulation(.25, [metrics, window])
+window.show()
+status = app.exec_()
+window.runner.stop() # the last tick may still be reporting to metrics
+metrics.close()
+sys.exit(status)
@@ -1,47 +1,75 @@
-from random import randint
-from copy import deepcopy
+import numpy as np
 
 from ecosim.entities import *
+from ecosim.scent import ScentField
+from ecosim.occupancy import OccupancyIndex
+from ecosim.registry import EntityRegistry
+from ecosim.plants import PlantLayer
+from ecosim.chunks import ChunkedGrid
+from ecosim.timers import TimerWheel
+from ecosim.physiology import BodyPool, PooledBody
+from ecosim.rng import RandomStreams
+from ecosim import genetics
 
 
 class Cell:
+    __slots__ = ('organisms',)
+
     def __init__(self):
-        self.particles = []
-        self.incomingParticles = []
-        self.outgoingParticles = []
         self.organisms = []
         
                      
 class Board:
-    def __init__(self, window, creatureTemplate=None, rows=30, cols=40):
-        self.window = window
+    def __init__(self, creatureTemplate=None, rows=30, cols=40, observers=(), firstId=0, plantLayer=False, rng=None,
+                 templates=None, eliteSize=1, scentWorkers=None, chunkSize=None, sleepAfter=50, populate=True,
+                 batchPhysiology=False):
+        self.rng = rng or RandomStreams()
+        self.observers = observers
         self.creatureTemplate = creatureTemplate
+        # brains that new herbivores are mutated from, defaults to the brain of creatureTemplate
+        self.templates = templates if templates is not None else [creatureTemplate.brain] if creatureTemplate else []
+        self.eliteSize = eliteSize
+        self.elite = [] # the eliteSize longest lived herbivores that died on this board, oldest first
         self.rows = rows
         self.cols = cols
-        self.entities = []
+        self.entities = EntityRegistry(firstId)
         self.carnivores = 0
         self.herbivores = 0
         self.oldestHerbivore = 0
-        self.board = [[Cell() for col in range(self.cols)] for row in range(self.rows)]
-        self.populateBoard()
+        self.births = [] # (offspring, parent, mate) triples waiting for their brains to be bred
+        self.tick = 0 # number of the tick in progress, counted from the creation of the board
+        self.timers = TimerWheel(self.tick) # wakes dormant organisms, see sleepUntil
+        self.chunkSize = chunkSize # side of the chunks cells are allocated and put to sleep in, None for a plain grid
+        self.sleepAfter = sleepAfter # ticks a chunk without animals or scent must go unchanged before it sleeps
+        if chunkSize is None:
+            self.board = [[Cell() for col in range(self.cols)] for row in range(self.rows)]
+        else:
+            self.board = ChunkedGrid(self.rows, self.cols, chunkSize, Cell)
+        self.scent = ScentField(self.rows, self.cols, workers=scentWorkers)
+        self.occupancy = OccupancyIndex(self.rows, self.cols)
+        self.plants = PlantLayer(self.rows, self.cols, self.rng.dispersal.generator) if plantLayer else None # holds plants and seeds instead of the entity registry
+        self.bodies = BodyPool() if batchPhysiology else None # holds the bodies of the animals, which are metabolized all at once
+        if populate: # empty boards are filled from a checkpoint
+            self.populateBoard()
 
     def __getitem__(self, row):
         return self.board[row]
 
-    def queueEntities(self):
-        for entity in self.entities:
-            entity.processed = False
-
     def addEntity(self, entity, coords):
         '''
         Adds entity to list corresponding to the class of entity and inserts it into the cell
         at coords. Cell order is based on entity.displayPriority
         '''
+        if self.chunkSize is not None:
+            entity.chunk = self.touch(coords)
         entity.coords = coords
         row, col = coords
         if entity not in self.entities:
-            self.entities.append(entity)
-            self.window.addEntity(entity)
+            self.entities.add(entity)
+            for observer in self.observers:
+                observer.addEntity(entity)
+        if self.bodies is not None and isinstance(entity, Animal) and isinstance(entity.body, AnimalBody):
+            self.bodies.adopt(entity)
         i = 0
         cellEntities = self.board[row][col].organisms
         if len(cellEntities) == 0:
@@ -50,23 +78,35 @@ class Board:
             while i < len(cellEntities) and entity.displayPriority > cellEntities[i].displayPriority:
                 i += 1 
             cellEntities.insert(i, entity)
+        self.occupancy.add(entity, coords)
  
     def removeEntityFromBoard(self, entity):
         '''
-        Removes entity from board, but leaves it in the entities list.
+        Removes entity from board, but leaves it in the entity registry.
         '''
         row, col = entity.coords
+        if self.chunkSize is not None:
+            self.touch((row, col))
         entity.coords = None
         self.board[row][col].organisms.remove(entity)
+        self.occupancy.remove(entity, (row, col))
+        if self.chunkSize is not None:
+            self.board.release((row, col))
 
     def deleteEntity(self, entity):
         '''
         Completely destroys entity.
         '''
+        if entity.id is None and self.plants is not None:
+            self.plants.remove(entity.coords)
+            entity.coords = None
+            return
         self.entities.remove(entity)
         self.removeEntityFromBoard(entity)
-        if entity.label:
-            entity.label.deleteLater()
+        if self.bodies is not None and isinstance(entity, Animal) and isinstance(entity.body, PooledBody):
+            self.bodies.release(entity)
+        for observer in self.observers:
+            observer.removeEntity(entity)
 
     def replaceEntity(self, target, replacement):
         '''
@@ -88,6 +128,10 @@ class Board:
         '''
         Iterates over list at given coords and returns the first instance of classObject encountered.
         '''
+        if self.plants is not None and self.plants.contains(coords, classObject):
+            return self.plants.entityAt(coords)
+        if not self.occupancy.contains(coords, classObject):
+            return None
         row, col = coords
         for entity in self.board[row][col].organisms:
             if isinstance(entity, classObject):
@@ -98,8 +142,12 @@ class Board:
         '''
         Iterates over list at given coords and returns a list of all instances of classObject encountered.
         '''
-        row, col = coords
         entities = []
+        if self.plants is not None and self.plants.contains(coords, classObject):
+            entities.append(self.plants.entityAt(coords))
+        if not self.occupancy.contains(coords, classObject):
+            return entities
+        row, col = coords
         for entity in self.board[row][col].organisms:
             if isinstance(entity, classObject):
                 entities.append(entity)
@@ -109,6 +157,13 @@ class Board:
         '''
         Iterates over list at given coords and returns first instance of any object in classes encountered.
         '''
+        for classObject in classes:
+            if self.plants is not None and self.plants.contains(coords, classObject):
+                return self.plants.entityAt(coords)
+            if self.occupancy.contains(coords, classObject):
+                break
+        else:
+            return None
         row, col = coords
         for entity in self.board[row][col].organisms:
             for classObject in classes:
@@ -118,52 +173,35 @@ class Board:
 
     def cellContains(self, coords, classObject):
         '''
-        Checks if cell at coords contains an instance of classObject.
+        Checks if cell at coords contains an instance of classObject, or if it is empty when
+        classObject is None. Coords at most one cell off the board contain nothing, covered by the
+        border of the occupancy grids; check coords further off with validPosition first.
         '''
-        row, col = coords
         if classObject is None:
-            if len(self.board[row][col].organisms) == 0:
-                return True
-            else:
+            if self.plants is not None and self.validPosition(coords) and self.plants.occupied(coords):
                 return False
-        for entity in self.board[row][col].organisms:
-            if isinstance(entity, classObject):
-                return True
-        return False
+            return not self.occupancy.contains(coords, Entity)
+        if self.plants is not None and self.plants.contains(coords, classObject):
+            return True
+        return self.occupancy.contains(coords, classObject)
 
     def checkForAdjacentAnimal(self, coords):
-        directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-        while len(directions) > 0:
-            direction = directions[randint(0, len(directions) - 1)]
-            coordsAtDirection = self.getCoordsAtDirection(coords, direction)
-            if self.cellContains(coordsAtDirection, Animal):
-                return True
-            else:
-                directions.remove(direction)
-        return False
+        return len(self.occupancy.adjacentDirections(coords, Animal)) > 0
 
     def searchForEmptySpace(self, coords):
-        directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-        while len(directions) > 0:
-            direction = directions[randint(0, len(directions) - 1)]
-            coordsAtDirection = self.getCoordsAtDirection(coords, direction)
-            if self.validPosition(coordsAtDirection) and not self.cellContains(coordsAtDirection, Animal):
-                return self.getCoordsAtDirection(coords, direction)
-            else:
-                directions.remove(direction)
-        return None 
+        '''
+        Returns the coords of a random adjacent cell on the board that does not contain an Animal.
+        '''
+        directions = self.occupancy.adjacentDirections(coords, Animal, present=False, validOnly=True)
+        if len(directions) == 0:
+            return None
+        return self.getCoordsAtDirection(coords, directions[self.rng.breeding.randint(0, len(directions) - 1)])
 
     def searchForAdjacentClass(self, coords, classObj):
-        directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-        while len(directions) > 0:
-            direction = directions[randint(0, len(directions) - 1)]
-            coordsAtDirection = self.getCoordsAtDirection(coords, direction)
-            if self.cellContains(coordsAtDirection, classObj):
-                return self.getCoordsAtDirection(coords, direction)
-            else:
-                directions.remove(direction)
-        return None
-
+        directions = self.occupancy.adjacentDirections(coords, classObj)
+        if len(directions) == 0:
+            return None
+        return self.getCoordsAtDirection(coords, directions[self.rng.movement.randint(0, len(directions) - 1)])
 
     def moveEntity(self, entity, coords):
         '''
@@ -176,6 +214,8 @@ class Board:
             self.removeEntityFromBoard(entity)
         entity.coords = (row, col)
         self.addEntity(entity, coords)
+        for observer in self.observers:
+            observer.moveEntity(entity)
 
     def getCoordsAtDirection(self, initialCoords, direction, magnitude=1):
         '''
@@ -215,37 +255,159 @@ class Board:
         else:
             return True
 
-    def raiseLabels(self):
+    def metabolize(self):
+        '''
+        Metabolizes every animal run in this tick in one batched step, then kills those that starved
+        in the order they were run. Used instead of AnimalBody.metabolize when self.bodies is set.
+        '''
+        for animal in self.bodies.metabolize():
+            animal.die(self)
+
+    def recordElite(self, herbivore):
+        '''
+        Keeps herbivore in self.elite if it is one of the eliteSize oldest to die so far.
+        '''
+        if len(self.elite) >= self.eliteSize and herbivore.age <= self.elite[-1].age:
+            return
+        i = 0
+        while i < len(self.elite) and self.elite[i].age >= herbivore.age:
+            i += 1
+        self.elite.insert(i, herbivore)
+        del self.elite[self.eliteSize:]
+
+    def breedBrains(self, rng=None):
         '''
-        Raises labels so that labels with the highest priorities appear on top.
+        Gives every offspring in self.births a brain crossed over from its parents and mutated.
+        All parent pairs are bred in one batch per network layer.
         '''
-        for entity in self.entities:
-            row, col = entity.coords
-            cellEntities = self.board[row][col].organisms
-            for i in reversed(range(len(cellEntities))):
-                if cellEntities[i].label:
-                    cellEntities[i].label.raise_()
+        if len(self.births) == 0:
+            return
+        rng = rng or self.rng.mutation.generator
+        shapes = self.births[0][1].brain.neuralNetwork.genes.shapes
+        parents = np.stack([parent.brain.neuralNetwork.genes.buffer for offspring, parent, mate in self.births])
+        mates = np.stack([mate.brain.neuralNetwork.genes.buffer for offspring, parent, mate in self.births])
+        offspringWeights = genetics.breed(genetics.layerViews(parents, shapes), genetics.layerViews(mates, shapes), rng)
+        genomes = np.concatenate([layer.reshape(len(self.births), -1) for layer in offspringWeights], axis=1)
+        for genome, (offspring, parent, mate) in zip(genomes, self.births):
+            offspring.brain = Brain(genome=genetics.Genome(shapes, genome))
+        self.births.clear()
 
-    def sortEntities(self):
-        self.entities.sort(key=lambda x: x.speed, reverse=True) # faster entities go first
+    def touch(self, coords):
+        '''
+        Records that an entity is entering or leaving the chunk at coords, waking the chunk first
+        if it is asleep. Returns the chunk.
+        '''
+        chunk = self.board.chunkAt(coords)
+        if chunk.asleep:
+            self.wakeChunk(chunk)
+        chunk.lastChange = self.tick
+        return chunk
+
+    def wakeChunk(self, chunk):
+        '''
+        Wakes chunk, puts its organisms back on the run queue and fast-forwards them through the
+        ticks they skipped, including the current one. Dormant organisms whose timers came due
+        while the chunk slept are put back on the run queue and fast-forwarded as due from their
+        wake tick; the others stay dormant until their timers come due.
+        '''
+        chunk.asleep = False
+        tick = self.tick
+        ticks = tick - chunk.sleptAt
+        for organism in chunk.organisms():
+            if organism.coords is None:
+                continue
+            if organism.wakeAt is None:
+                if organism.id in self.entities.dormant: # parked when the chunk fell asleep
+                    self.entities.resume(organism)
+                if ticks > 0:
+                    organism.fastForward(self, ticks)
+            elif organism.wakeAt <= tick and organism in self.entities:
+                # its timer has already fired, so there is nothing left to cancel
+                skipped = tick - organism.wakeAt + 1
+                organism.wakeAt = None
+                self.entities.resume(organism)
+                organism.fastForward(self, skipped, due=True)
+
+    def sleepUntil(self, organism, tick):
+        '''
+        Takes organism off the run queue until tick, on which it is run again. Organisms with
+        nothing to do until a known tick sleep instead of being visited every tick.
+        '''
+        organism.wakeAt = tick
+        self.entities.suspend(organism)
+        self.timers.schedule(organism, tick)
+
+    def wakeDue(self):
+        '''
+        Puts the organisms due on the current tick back on the run queue, in id order. Must be
+        called once per tick, before the organisms to run are collected. Organisms in a sleeping
+        chunk are left dormant, without waking the chunk, and are caught up when it wakes.
+        '''
+        tick = self.tick
+        due = [organism for organism in self.timers.advance(tick) if organism.wakeAt == tick and organism in self.entities]
+        due.sort(key=lambda organism: organism.id)
+        for organism in due:
+            if organism.chunk is not None and organism.chunk.asleep:
+                continue
+            organism.wakeAt = None
+            self.entities.resume(organism)
+
+    def updateChunks(self):
+        '''
+        Called at the end of every tick. Chunks with an animal or scent in them are woken, and
+        chunks without either fall asleep once no entity has entered or left them for sleepAfter
+        ticks. Empty chunks are dropped.
+        '''
+        if self.chunkSize is None:
+            return
+        grid = self.board
+        active = np.zeros((grid.chunkRows, grid.chunkCols), dtype=bool)
+        animals = self.occupancy.counts.get(Animal)
+        if animals is not None:
+            active |= grid.blockAny(animals[1:-1, 1:-1])
+        for field in self.scent.fields.values():
+            active |= grid.blockAny(field)
+        for key, chunk in list(grid.chunks.items()):
+            if active[key]:
+                if chunk.asleep:
+                    self.wakeChunk(chunk)
+            elif len(chunk.cells) == 0:
+                del grid.chunks[key]
+            elif not chunk.asleep and self.tick - chunk.lastChange >= self.sleepAfter:
+                self.sleepChunk(chunk)
+
+    def sleepChunk(self, chunk):
+        '''
+        Puts chunk to sleep at the end of the current tick and parks its organisms off the run
+        queue, so ticks only visit the organisms of awake chunks. wakeChunk puts them back.
+        '''
+        chunk.asleep = True
+        chunk.sleptAt = self.tick
+        for organism in chunk.organisms():
+            if self.entities.queued(organism):
+                self.entities.suspend(organism)
 
     def populateBoard(self):
         herbivoreChance = 8
         carnivoreChance = 3
         plantChance = 70
+        rng = self.rng.placement
         for row in range(self.rows):
             for col in range(self.cols):
-                roll = randint(1, 100)
+                roll = rng.randint(1, 100)
                 coords = (row, col)
                 if roll <= plantChance:
-                    self.addEntity(Plant(coords, 0, randint(10, 25)), coords)
+                    if self.plants is not None:
+                        self.plants.addPlant(coords, 0, rng.randint(10, 25))
+                    else:
+                        self.addEntity(Plant(coords, 0, rng.randint(10, 25)), coords)
                 if roll <= herbivoreChance:
-                    if self.creatureTemplate is None:
-                        self.addEntity(Herbivore(coords), coords)
+                    if len(self.templates) == 0:
+                        self.addEntity(Herbivore(coords, rng=rng), coords)
                     else:
-                        newHerbivore = Herbivore(coords)
-                        newHerbivore.brain = deepcopy(self.creatureTemplate.brain)
-                        newHerbivore.brain.mutate()
+                        template = self.templates[0] if len(self.templates) == 1 else self.templates[rng.randint(0, len(self.templates) - 1)]
+                        newHerbivore = Herbivore(coords, rng=rng, brain=template.clone())
+                        newHerbivore.brain.mutate(self.rng.mutation.generator)
                         self.addEntity(newHerbivore, coords)
                     self.herbivores += 1
                 # elif roll <= herbivoreChance + carnivoreChance:
@@ -265,8 +427,3 @@ class Board:
         for row in self.rows:
             for col in self.cols:
                 function(self.board[row][col])
-
-    def consolidateParticles(self, board):
-        for row in range(self.rows):
-            for col in range(self.cols):
-                self.board[row][col].consolidateParticles(board)
\ No newline at end of file
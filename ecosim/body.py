@@ -1,25 +1,55 @@
-from random import uniform, randint
+import math
+
+import numpy as np
 
 from ecosim.constants import *
 from ecosim.neural_network import NeuralNetwork
+from ecosim import genetics
+from ecosim.genetics import Genome
 
 
 class Nose:
-    def __init__(self, particleThreshold=25):
-        self.particleThreshold = particleThreshold
+    __slots__ = ('scentThreshold',)
+    # offsets of the 3x3 neighbourhood in row-major order, into grids padded by one cell
+    rowOffsets = np.repeat(np.arange(3), 3)
+    colOffsets = np.tile(np.arange(3), 3)
+
+    def __init__(self, scentThreshold=25):
+        self.scentThreshold = scentThreshold
 
     def smell(self, animal, board, targetClass): 
         row, col = animal.coords
         size = 3
+        field = board.scent[targetClass]
         scentMatrix = [[0 for i in range(size)] for j in range(size)]
         for y in range(size):
             for x in range(size):
-                if board.validPosition((row + y - 1, col + x - 1)) and not board.cellContains(animal.coords, animal.__class__):
-                    for particle in board[row + y - 1][col + x - 1].particles:
-                        if particle.sourceClass == targetClass and particle.count >= self.particleThreshold:
-                            scentMatrix[y][x] = particle.count 
-                            break    
+                coords = (row + y - 1, col + x - 1)
+                if board.validPosition(coords) and not board.cellContains(coords, animal.__class__):
+                    count = field[coords]
+                    if count >= self.scentThreshold:
+                        scentMatrix[y][x] = count
         return scentMatrix            
+
+    @classmethod
+    def smellAll(cls, animals, board, targetClass):
+        '''
+        Returns an (n, 9) array whose rows are what smell returns for each of animals, flattened.
+        The field is padded once and every neighbourhood is gathered in one indexing operation.
+        '''
+        coords = np.array([animal.coords for animal in animals], dtype=np.intp).reshape(-1, 2)
+        rows = coords[:, :1] + cls.rowOffsets # indices into grids with a border of one cell
+        cols = coords[:, 1:] + cls.colOffsets
+        scent = np.pad(board.scent[targetClass], 1)[rows, cols] # cells off the board smell of nothing
+        # neither do cells holding an animal of the smeller's own class, including its own
+        animalClasses = [animal.__class__ for animal in animals]
+        for animalClass in set(animalClasses):
+            smellers = np.array([c is animalClass for c in animalClasses])
+            occupied = board.occupancy.counts[animalClass][rows[smellers], cols[smellers]] > 0
+            scent[smellers] = np.where(occupied, 0, scent[smellers])
+        thresholds = np.array([animal.nose.scentThreshold for animal in animals]).reshape(-1, 1)
+        scent[scent < thresholds] = 0
+        return scent
       
 # TODO eyes should perceive edges of the map and visible entities in adjacent tiles
 class Eyes:
@@ -27,49 +57,63 @@ class Eyes:
         pass
 
 class Brain:
-    def __init__(self):
-        self.neuralNetwork = NeuralNetwork()
+    __slots__ = ('neuralNetwork',)
+
+    def __init__(self, rng=None, genome=None):
+        self.neuralNetwork = NeuralNetwork(rng, genome)
+
+    @classmethod
+    def fromGenome(cls, genome):
+        '''
+        Returns a Brain with a copy of genome, a flat array as returned by NeuralNetwork.genome.
+        '''
+        return cls(genome=Genome(NeuralNetwork.shapes, np.array(genome, dtype=np.float64)))
+
+    def clone(self):
+        return Brain(genome=self.neuralNetwork.genes.clone())
 
     def decide(self, inputs):
         return self.neuralNetwork.forwardPropagate(inputs)
 
-    def mutate(self):
+    def mutate(self, rng=None):
         for theta in self.neuralNetwork.weights:
-            for row in range(len(theta)):
-                for col in range(len(theta[0])):
-                    if randint(1, 100) <= 3:
-                        theta[row][col] = uniform(-1, 1)
-                    variance = theta[row][col] * .05
-                    theta[row][col] += uniform(-variance / 2, variance / 2)
-
-    def inheritance(self, other):
+            genetics.mutate(theta, rng or genetics.defaultGenerator)
+
+    def inheritance(self, other, rng=None):
+        '''
+        Returns a new list of weights where each row of each layer is taken from self or other with
+        equal probability. Rows and layers only present in one parent are copied from it.
+        '''
+        rng = rng or genetics.defaultGenerator
         newWeights = []
-        maxLayerDepth = max(len(self.neuralNetwork.weights), len(other.neuralNetwork.weights))
-        for i in range(maxLayerDepth):
-            newWeights.append([])
-            if i >= len(self.neuralNetwork.weights):
-                numNodes = len(other.neuralNetwork.weights[i])
+        selfWeights = self.neuralNetwork.weights
+        otherWeights = other.neuralNetwork.weights
+        for i in range(max(len(selfWeights), len(otherWeights))):
+            if i >= len(selfWeights):
+                newWeights.append(otherWeights[i].copy())
+            elif i >= len(otherWeights):
+                newWeights.append(selfWeights[i].copy())
             else:
-                numNodes = len(self.neuralNetwork.weights[i])
-            for j in range(numNodes):
-                if j < len(self.neuralNetwork.weights[i]) and j < len(other.neuralNetwork.weights[i]):
-                    if randint(1, 100) <= 50:
-                        newWeights[i].append(self.neuralNetwork.weights[i][j])
-                    else:
-                        newWeights[i].append(other.neuralNetwork.weights[i][j])
-                elif j < len(self.neuralNetwork.weights[i]):
-                    newWeights[i].append(self.neuralNetwork.weights[i][j])
-                elif j < len(other.neuralNetwork.weights[i]):
-                    newWeights[i].append(other.neuralNetwork.weights[i][j])
+                longer = selfWeights[i] if len(selfWeights[i]) >= len(otherWeights[i]) else otherWeights[i]
+                numShared = min(len(selfWeights[i]), len(otherWeights[i]))
+                layer = longer.copy()
+                layer[:numShared] = genetics.crossover(selfWeights[i][:numShared], otherWeights[i][:numShared], rng)
+                newWeights.append(layer)
         return newWeights
 
 
-
-
 class Stomach:
+    '''
+    Holds what an animal has eaten as boluses of [mass, energyContent], digested oldest first.
+    Only the mass and energy per unit mass of the food are kept, so eaten organisms are not kept
+    alive by the stomach, and contentsMass is a running total rather than a sum over the boluses.
+    '''
+    __slots__ = ('body', 'contents', 'contentsMass', 'capacityRatio', 'digestionRate')
+
     def __init__(self, body, capacityRatio=.2, digestionRate=.05):
         self.body = body
-        self.contents = []
+        self.contents = [] # [mass, energyContent] of each bolus, oldest first; a stomach holds only a few
+        self.contentsMass = 0
         self.capacityRatio = capacityRatio
         self.digestionRate = digestionRate # TODO FIX
 
@@ -81,37 +125,39 @@ class Stomach:
     def capacityRemaining(self):
         return self.capacity - self.contentsMass
 
-    @property
-    def contentsMass(self):
-        mass = 0
-        for bolus in self.contents:
-            mass += bolus.body.mass
-        return mass
-
     @property
     def digestionCapacity(self):
         return self.digestionRate * self.body.mass
     
     def consume(self, organism):
-        edibleMass = organism.body.mass * organism.body.edibleMassFraction
-        organism.body.mass = min(edibleMass, self.capacityRemaining) 
-        self.contents.append(organism)
+        body = organism.body
+        self.add(min(body.mass * body.edibleMassFraction, self.capacityRemaining), body.energyContent)
+
+    def add(self, mass, energyContent):
+        self.contents.append([mass, energyContent])
+        self.contentsMass += mass
 
     def digest(self):
+        digestionCapacity = self.digestionCapacity
         amountDigested = 0
         energyGained = 0
-        while amountDigested < self.digestionCapacity and self.contentsMass > 0:
+        while amountDigested < digestionCapacity and self.contentsMass > 0:
             bolus = self.contents[0]
-            changeInMass = min(self.digestionCapacity - amountDigested, bolus.body.mass)
-            bolus.body.mass -= changeInMass
-            if bolus.body.mass <= 0:
+            changeInMass = min(digestionCapacity - amountDigested, bolus[0])
+            bolus[0] -= changeInMass
+            self.contentsMass -= changeInMass
+            if bolus[0] <= 0:
                 self.contents.pop(0)
+                if len(self.contents) == 0:
+                    self.contentsMass = 0 # drop any rounding error left in the total
             amountDigested += changeInMass 
-            energyGained += bolus.body.energyContent * changeInMass
+            energyGained += bolus[1] * changeInMass
         return energyGained - self.body.totalEnergyExpenditure
         
 
 class Body:
+    __slots__ = ('mass', 'massCapacity')
+
     def __init__(self, mass=10, massCapacity=100):
         self.mass = mass
         self.massCapacity = massCapacity
@@ -126,6 +172,9 @@ class Body:
 
     
 class AnimalBody(Body):
+    __slots__ = ('fatMassFraction', 'muscleMassFraction', 'fatStorageFraction', 'muscleStorageFraction', 'totalEnergyExpenditure',
+                 'satiationThreshold', 'starvationThreshold', 'satiationAmount', 'stomach')
+
     def __init__(self, mass=50, massCapacity=70):
         super().__init__(mass, massCapacity)
         self.fatMassFraction = .20
@@ -191,6 +240,8 @@ class AnimalBody(Body):
 
 
 class PlantBody(Body):
+    __slots__ = ('growthRate',)
+
     def __init__(self, mass=1, massCapacity=35):
         super().__init__(mass, massCapacity)
         self.growthRate = .4
@@ -200,6 +251,16 @@ class PlantBody(Body):
         if self.mass < self.massCapacity:
             self.mass += min(self.massCapacity, self.mass * self.growthRate)
 
+    def growFor(self, ticks):
+        '''
+        Grows as much as ticks calls to grow would. Below massCapacity, mass * growthRate is always
+        the smaller term, so every call multiplies mass by 1 + growthRate.
+        '''
+        if ticks <= 0 or self.mass <= 0 or self.mass >= self.massCapacity:
+            return
+        needed = math.ceil(math.log(self.massCapacity / self.mass) / math.log(1 + self.growthRate))
+        self.mass *= (1 + self.growthRate) ** min(ticks, max(needed, 1))
+
     @property
     def edibleMassFraction(self):
         return 1
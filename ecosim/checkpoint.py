@@ -0,0 +1,383 @@
+'''
+Saves the full state of a Simulation to a compact binary file and restores it, so long runs can be
+resumed and many experiments can be forked from one warmed-up world:
+
+    saveCheckpoint(simulation, 'warm.eco')
+    resumed = loadCheckpoint('warm.eco')
+    forked = loadCheckpoint('warm.eco', seed=7) # same world, different random numbers from here on
+
+A checkpoint is a short JSON header followed by raw numpy arrays aligned to 64 bytes. Entities are
+stored as one structured array per class, brains as one flat genome per row, and scent, the plant
+layer and the random number generator state as plain arrays. Arrays are loaded from a copy-on-write memory map, so
+large grids and brain weights are not copied until they are written to.
+'''
+import json
+import mmap
+import operator
+import os
+import struct
+
+import numpy as np
+
+from ecosim.simulation import Simulation
+from ecosim.observer import Observer
+from ecosim.entities import Entity, Organism, Animal, Herbivore, Carnivore, Plant, Seed
+from ecosim.body import Brain
+from ecosim.genetics import Genome
+from ecosim.neural_network import NeuralNetwork
+from ecosim.rng import RandomStreams
+from ecosim.timers import TimerWheel
+
+MAGIC = b'ECOSIMCP'
+VERSION = 4
+ALIGNMENT = 64
+PREFIX = struct.Struct('<8sIIQ') # magic, version, reserved, header length
+
+CLASSES = {cls.__name__: cls for cls in (Entity, Organism, Animal, Herbivore, Carnivore, Plant, Seed)}
+
+# (column, dtype, attribute path) of the state saved for each entity, by the class that defines it
+ENTITY_FIELDS = [
+    ('index', '<i8', None), # position in the saved entity order
+    ('id', '<i8', None),
+    ('row', '<i4', None),
+    ('col', '<i4', None),
+    ('cellPosition', '<i4', None), # index in the organisms list of its cell
+    ('wakeAt', '<i8', None), # tick a dormant entity wakes on, -1 if it is not dormant
+]
+CLASS_FIELDS = {
+    Organism: [
+        ('generation', '<i8', 'generation'),
+        ('age', '<i8', 'age'),
+        ('maturityAge', '<i8', 'maturityAge'),
+        ('health', '<f8', 'health'),
+        ('healthBaseline', '<f8', 'healthBaseline'),
+        ('speed', '<f8', 'speed'),
+        ('speedBaseline', '<f8', 'speedBaseline'),
+    ],
+    Animal: [
+        ('mass', '<f8', 'body.mass'),
+        ('massCapacity', '<f8', 'body.massCapacity'),
+        ('fatMassFraction', '<f8', 'body.fatMassFraction'),
+        ('muscleMassFraction', '<f8', 'body.muscleMassFraction'),
+        ('fatStorageFraction', '<f8', 'body.fatStorageFraction'),
+        ('muscleStorageFraction', '<f8', 'body.muscleStorageFraction'),
+        ('totalEnergyExpenditure', '<f8', 'body.totalEnergyExpenditure'),
+        ('satiationThreshold', '<f8', 'body.satiationThreshold'),
+        ('starvationThreshold', '<f8', 'body.starvationThreshold'),
+        ('satiationAmount', '<f8', 'body.satiationAmount'),
+        ('capacityRatio', '<f8', 'body.stomach.capacityRatio'),
+        ('digestionRate', '<f8', 'body.stomach.digestionRate'),
+        ('contentsMass', '<f8', 'body.stomach.contentsMass'),
+        ('scentThreshold', '<f8', 'nose.scentThreshold'),
+        ('strength', '<f8', 'strength'),
+        ('strengthBaseline', '<f8', 'strengthBaseline'),
+        ('stepsToBreed', '<i8', 'stepsToBreed'),
+        ('remainingStepsToBreed', '<i8', 'remainingStepsToBreed'),
+    ],
+    Plant: [
+        ('mass', '<f8', 'body.mass'),
+        ('massCapacity', '<f8', 'body.massCapacity'),
+        ('growthRate', '<f8', 'body.growthRate'),
+        ('germinationChance', '<i8', 'germinationChance'),
+        ('seeding', '?', 'seeding'),
+    ],
+    Seed: [
+        ('daysToSprout', '<i8', 'daysToSprout'),
+    ],
+}
+BOLUS_DTYPE = np.dtype([('owner', '<i8'), ('mass', '<f8'), ('energyContent', '<f8')])
+PLANT_LAYER_ARRAYS = ['state', 'mass', 'massCapacity', 'generation', 'daysToSprout']
+CONFIG = ['waitBetweenRounds', 'rows', 'cols', 'batchDecisions', 'plantLayer', 'eliteSize', 'scentWorkers', 'chunkSize', 'batchPhysiology']
+
+
+def fieldsOf(cls):
+    fields = list(ENTITY_FIELDS)
+    for base in reversed(cls.__mro__):
+        fields += CLASS_FIELDS.get(base, [])
+    return fields
+
+
+def setPath(target, attribute, value):
+    *parents, name = attribute.split('.')
+    for parent in parents:
+        target = getattr(target, parent)
+    setattr(target, name, value)
+
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class CheckpointWriter:
+    '''
+    Collects the arrays of a checkpoint and writes them after the header.
+    '''
+    def __init__(self):
+        self.arrays = {}
+        self.size = 0
+
+    def add(self, name, array):
+        array = np.ascontiguousarray(array)
+        self.arrays[name] = (self.size, array)
+        self.size = align(self.size + array.nbytes)
+
+    def layout(self):
+        return {name: {'offset': offset, 'dtype': np.lib.format.dtype_to_descr(array.dtype), 'shape': list(array.shape)}
+                for name, (offset, array) in self.arrays.items()}
+
+    def write(self, path, header):
+        header = dict(header, arrays=self.layout())
+        headerBytes = json.dumps(header).encode()
+        start = align(PREFIX.size + len(headerBytes))
+        temporaryPath = path + '.tmp'
+        with open(temporaryPath, 'wb') as outputFile:
+            outputFile.write(PREFIX.pack(MAGIC, VERSION, 0, len(headerBytes)))
+            outputFile.write(headerBytes)
+            for offset, array in self.arrays.values():
+                outputFile.seek(start + offset)
+                outputFile.write(memoryview(array).cast('B'))
+            outputFile.truncate(start + self.size)
+        os.replace(temporaryPath, path) # an interrupted save never leaves a truncated checkpoint behind
+
+
+def writeBrains(writer, name, brains):
+    if len(brains) > 0:
+        writer.add(name, np.stack([brain.neuralNetwork.genes.buffer for brain in brains]))
+
+
+def saveCheckpoint(simulation, path):
+    '''
+    Writes the state of simulation to path. Call between ticks, for example from an observer's
+    tickEnded. Observers and the profiler are not saved.
+    '''
+    board = simulation.board
+    writer = CheckpointWriter()
+
+    # entities on the board in registry order, then dead ones still referenced by the board
+    entities = board.entities.snapshot()
+    registered = len(entities)
+    indices = {id(entity): index for index, entity in enumerate(entities)}
+    for entity in board.elite + [board.creatureTemplate]:
+        if entity is not None and id(entity) not in indices:
+            indices[id(entity)] = len(entities)
+            entities.append(entity)
+
+    byClass = {}
+    for index, entity in enumerate(entities):
+        byClass.setdefault(entity.__class__, []).append((index, entity))
+    classes = []
+    for cls, members in byClass.items():
+        fields = fieldsOf(cls)
+        table = np.zeros(len(members), dtype=[(column, dtype) for column, dtype, attribute in fields])
+        table['index'] = [index for index, entity in members]
+        table['id'] = [-1 if entity.id is None else entity.id for index, entity in members]
+        table['row'] = [-1 if entity.coords is None else entity.coords[0] for index, entity in members]
+        table['col'] = [-1 if entity.coords is None else entity.coords[1] for index, entity in members]
+        table['cellPosition'] = [-1 if entity.coords is None else board[entity.coords[0]][entity.coords[1]].organisms.index(entity) for index, entity in members]
+        table['wakeAt'] = [-1 if entity.wakeAt is None else entity.wakeAt for index, entity in members]
+        for column, dtype, attribute in fields:
+            if attribute is not None:
+                getter = operator.attrgetter(attribute)
+                table[column] = [getter(entity) for index, entity in members]
+        writer.add('entities.' + cls.__name__, table)
+        if issubclass(cls, Animal):
+            writeBrains(writer, 'brains.' + cls.__name__, [entity.brain for index, entity in members])
+        classes.append(cls.__name__)
+
+    boluses = []
+    for index, entity in enumerate(entities):
+        if isinstance(entity, Animal):
+            boluses += [(index, mass, energyContent) for mass, energyContent in entity.body.stomach.contents]
+    writer.add('boluses', np.array(boluses, dtype=BOLUS_DTYPE))
+
+    writeBrains(writer, 'templates', board.templates)
+    writeBrains(writer, 'immigrants', simulation.immigrants)
+    for cls, field in board.scent.fields.items():
+        writer.add('scent.' + cls.__name__, field)
+    if board.plants is not None:
+        for name in PLANT_LAYER_ARRAYS:
+            writer.add('plants.' + name, getattr(board.plants, name))
+    if board.chunkSize is not None:
+        chunks = list(board.board.chunks.values())
+        writer.add('chunks.key', np.array([chunk.key for chunk in chunks], dtype=np.int32).reshape(-1, 2))
+        writer.add('chunks.asleep', np.array([chunk.asleep for chunk in chunks], dtype=bool))
+        writer.add('chunks.lastChange', np.array([chunk.lastChange for chunk in chunks], dtype=np.int64))
+        writer.add('chunks.sleptAt', np.array([chunk.sleptAt for chunk in chunks], dtype=np.int64))
+
+    rng = {}
+    for name in simulation.rng.names:
+        state = getattr(simulation.rng, name).getState()
+        version, internal, gauss = state['random']
+        writer.add('rng.' + name, np.array(internal, dtype=np.uint32))
+        rng[name] = {'version': version, 'gauss': gauss, 'generator': state['generator']}
+
+    seed = simulation.seed
+    header = {
+        'config': dict({name: getattr(simulation, name) for name in CONFIG}, brainDtype=np.dtype(simulation.brainDtype).str),
+        'seed': list(seed) if isinstance(seed, (tuple, list)) else int(seed),
+        'round': simulation.round,
+        'iteration': simulation.iteration,
+        'iterationsInRound': simulation.iterationsInRound,
+        'board': {
+            'carnivores': board.carnivores,
+            'herbivores': board.herbivores,
+            'oldestHerbivore': board.oldestHerbivore,
+            'tick': board.tick,
+            'sleepAfter': board.sleepAfter,
+            'nextId': board.entities.nextId,
+            'registered': registered,
+            'elite': [indices[id(entity)] for entity in board.elite],
+            'creatureTemplate': indices[id(board.creatureTemplate)] if board.creatureTemplate is not None else None,
+            'templates': len(board.templates),
+        },
+        'immigrants': len(simulation.immigrants),
+        'classes': classes,
+        'scent': [cls.__name__ for cls in board.scent.fields],
+        'brainShapes': NeuralNetwork.shapes,
+        'rng': rng,
+    }
+    writer.write(path, header)
+
+
+class CheckpointReader:
+    '''
+    Maps a checkpoint file copy-on-write and returns its arrays without copying them.
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as inputFile:
+            self.memory = mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_COPY)
+        if len(self.memory) < PREFIX.size or PREFIX.unpack_from(self.memory)[0] != MAGIC:
+            raise ValueError('{} is not an ecosim checkpoint'.format(path))
+        magic, version, reserved, headerLength = PREFIX.unpack_from(self.memory)
+        if version != VERSION:
+            raise ValueError('{} has checkpoint version {}, expected {}'.format(path, version, VERSION))
+        self.header = json.loads(bytes(self.memory[PREFIX.size:PREFIX.size + headerLength]))
+        self.start = align(PREFIX.size + headerLength)
+
+    def __contains__(self, name):
+        return name in self.header['arrays']
+
+    def __getitem__(self, name):
+        layout = self.header['arrays'][name]
+        descr = layout['dtype']
+        dtype = np.dtype([tuple(field) for field in descr]) if isinstance(descr, list) else np.lib.format.descr_to_dtype(descr)
+        count = int(np.prod(layout['shape'], dtype=np.int64))
+        return np.frombuffer(self.memory, dtype, count, self.start + layout['offset']).reshape(layout['shape'])
+
+    def brains(self, name, count):
+        if count == 0:
+            return []
+        shapes = self.header['brainShapes']
+        return [Brain(genome=Genome(shapes, genome)) for genome in self[name]]
+
+
+def loadCheckpoint(path, observers=None, seed=None, profiler=None):
+    '''
+    Returns a Simulation restored from the checkpoint at path, with observers attached once it is
+    restored. Passing seed reseeds every random number stream, so forks of the same checkpoint
+    diverge; without it the run continues exactly as the saved one would have.
+    '''
+    reader = CheckpointReader(path)
+    header = reader.header
+    config = dict(header['config'], brainDtype=np.dtype(header['config']['brainDtype']).type)
+    savedSeed = header['seed']
+    simulation = Simulation(seed=tuple(savedSeed) if isinstance(savedSeed, list) else savedSeed, profiler=profiler, populate=False, **config)
+    board = simulation.board
+    scratch = RandomStreams(0).placement # absorbs the draws made by entity constructors
+
+    boardState = header['board']
+    entities = [None] * sum(len(reader['entities.' + name]) for name in header['classes'])
+    placements = []
+    for name in header['classes']:
+        cls = CLASSES[name]
+        table = reader['entities.' + name]
+        columns = {column: table[column].tolist() for column in table.dtype.names}
+        fields = [(column, attribute) for column, dtype, attribute in fieldsOf(cls) if attribute is not None]
+        brains = reader.brains('brains.' + name, len(table)) if issubclass(cls, Animal) else None
+        for i in range(len(table)):
+            coords = (columns['row'][i], columns['col'][i]) if columns['row'][i] >= 0 else None
+            entity = cls(coords, rng=scratch, brain=brains[i]) if brains is not None else cls(coords)
+            for column, attribute in fields:
+                setPath(entity, attribute, columns[column][i])
+            entity.id = columns['id'][i] if columns['id'][i] >= 0 else None
+            entity.wakeAt = columns['wakeAt'][i] if columns['wakeAt'][i] >= 0 else None
+            index = columns['index'][i]
+            entities[index] = entity
+            if coords is not None:
+                placements.append((columns['cellPosition'][i], index))
+
+    for owner, mass, energyContent in reader['boluses'].tolist(): # contentsMass is restored with the animal
+        entities[owner].body.stomach.contents.append([mass, energyContent])
+
+    # the registry is rebuilt in saved order, then cells are filled back to front, since
+    # addEntity places an entity in front of others of the same displayPriority
+    board.tick = boardState['tick']
+    board.sleepAfter = boardState['sleepAfter']
+    for entity in entities[:boardState['registered']]:
+        board.entities.add(entity)
+    board.entities.nextId = boardState['nextId']
+    if board.chunkSize is not None:
+        for chunkRow, chunkCol in reader['chunks.key'].tolist(): # chunks are updated in the order they were created
+            board.board.chunkAt((chunkRow * board.chunkSize, chunkCol * board.chunkSize))
+    for cellPosition, index in sorted(placements, reverse=True):
+        entity = entities[index]
+        board.addEntity(entity, entity.coords)
+    if board.chunkSize is not None: # restored after placing, which touches the chunks
+        keys = reader['chunks.key'].tolist()
+        states = zip(reader['chunks.asleep'].tolist(), reader['chunks.lastChange'].tolist(), reader['chunks.sleptAt'].tolist())
+        for key, (asleep, lastChange, sleptAt) in zip(keys, states):
+            chunk = board.board.chunks.get(tuple(key))
+            if chunk is not None:
+                chunk.asleep, chunk.lastChange, chunk.sleptAt = asleep, lastChange, sleptAt
+    board.timers = TimerWheel(board.tick)
+    for entity in entities[:boardState['registered']]: # dormant entities are saved in the order they were suspended
+        if entity.wakeAt is None:
+            if entity.chunk is not None and entity.chunk.asleep and board.entities.queued(entity): # parked with its chunk
+                board.entities.suspend(entity)
+        elif entity.wakeAt > board.tick:
+            board.sleepUntil(entity, entity.wakeAt)
+        else: # its timer fired while its chunk slept, and the chunk catches it up when it wakes
+            board.entities.suspend(entity)
+
+    board.carnivores = boardState['carnivores']
+    board.herbivores = boardState['herbivores']
+    board.oldestHerbivore = boardState['oldestHerbivore']
+    board.elite = [entities[index] for index in boardState['elite']]
+    if boardState['creatureTemplate'] is not None:
+        board.creatureTemplate = entities[boardState['creatureTemplate']]
+    board.templates = reader.brains('templates', boardState['templates'])
+    simulation.immigrants = reader.brains('immigrants', header['immigrants'])
+    for name in header['scent']:
+        board.scent.fields[CLASSES[name]] = reader['scent.' + name]
+    if board.plants is not None:
+        for name in PLANT_LAYER_ARRAYS:
+            setattr(board.plants, name, reader['plants.' + name])
+
+    simulation.round = header['round']
+    simulation.iteration = header['iteration']
+    simulation.iterationsInRound = header['iterationsInRound']
+    if seed is None:
+        for name, state in header['rng'].items():
+            internal = tuple(reader['rng.' + name].tolist())
+            getattr(simulation.rng, name).setState({'random': (state['version'], internal, state['gauss']), 'generator': state['generator']})
+    else:
+        simulation.rng.setState(RandomStreams(seed).getState())
+        simulation.seed = simulation.rng.seed = seed
+    for observer in observers or []:
+        simulation.attach(observer)
+    return simulation
+
+
+class Checkpointer(Observer):
+    '''
+    Saves the simulation to path every interval ticks, replacing the previous checkpoint.
+    '''
+    def __init__(self, path, interval=1000):
+        self.path = path
+        self.interval = interval
+        self.ticks = 0
+
+    def tickEnded(self, simulation):
+        self.ticks += 1
+        if self.ticks % self.interval == 0:
+            saveCheckpoint(simulation, self.path)
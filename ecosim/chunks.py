@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class Chunk:
+    '''
+    A square block of chunkSize x chunkSize cells. Cells are created the first time they are used
+    and dropped again once they are empty, so a chunk only holds the cells that have entities.
+    '''
+    def __init__(self, key):
+        self.key = key # (chunkRow, chunkCol)
+        self.cells = {} # (row, col) -> Cell
+        self.asleep = False
+        self.lastChange = 0 # tick on which an entity last entered or left the chunk
+        self.sleptAt = 0 # tick at the end of which the chunk fell asleep
+
+    def organisms(self):
+        '''
+        Returns a list of every entity in the chunk, in row-major order of their cells.
+        '''
+        return [entity for coords in sorted(self.cells) for entity in self.cells[coords].organisms]
+
+
+class ChunkRow:
+    '''
+    One row of a ChunkedGrid, so cells can be looked up as grid[row][col] like a list of lists.
+    '''
+    def __init__(self, grid, row):
+        self.grid = grid
+        self.row = row
+
+    def __getitem__(self, col):
+        return self.grid.cell(self.row, col)
+
+
+class ChunkedGrid:
+    '''
+    The cells of a board, split into chunks that are only allocated once something is placed in
+    them. Memory grows with the number of occupied cells rather than with rows * cols.
+    '''
+    def __init__(self, rows, cols, chunkSize, cellFactory):
+        self.rows = rows
+        self.cols = cols
+        self.chunkSize = chunkSize
+        self.chunkRows = -(-rows // chunkSize)
+        self.chunkCols = -(-cols // chunkSize)
+        self.cellFactory = cellFactory
+        self.chunks = {} # (chunkRow, chunkCol) -> Chunk
+
+    def __getitem__(self, row):
+        return ChunkRow(self, row)
+
+    def chunkKey(self, coords):
+        row, col = coords
+        return (row // self.chunkSize, col // self.chunkSize)
+
+    def chunkAt(self, coords):
+        '''
+        Returns the chunk holding coords, allocating it if necessary.
+        '''
+        key = self.chunkKey(coords)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = Chunk(key)
+        return chunk
+
+    def cell(self, row, col):
+        cells = self.chunkAt((row, col)).cells
+        cell = cells.get((row, col))
+        if cell is None:
+            cell = cells[(row, col)] = self.cellFactory()
+        return cell
+
+    def release(self, coords):
+        '''
+        Drops the cell at coords if it is empty.
+        '''
+        chunk = self.chunks.get(self.chunkKey(coords))
+        if chunk is None:
+            return
+        cell = chunk.cells.get(coords)
+        if cell is not None and len(cell.organisms) == 0:
+            del chunk.cells[coords]
+
+    def blockAny(self, grid):
+        '''
+        Returns a (chunkRows, chunkCols) boolean array that is True for every chunk in which grid,
+        a rows x cols array, has a nonzero value.
+        '''
+        size = self.chunkSize
+        padded = np.zeros((self.chunkRows * size, self.chunkCols * size), dtype=bool)
+        padded[:self.rows, :self.cols] = grid != 0
+        return padded.reshape(self.chunkRows, size, self.chunkCols, size).any(axis=(1, 3))
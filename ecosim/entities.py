@@ -1,9 +1,7 @@
-from random import randint, uniform
-from copy import deepcopy
-
 from ecosim.constants import *
 from ecosim.neural_network import NeuralNetwork
 from ecosim.body import *
+from ecosim.rng import defaultStreams
 
 # TODO clean up checking for valid entities and indexes
 # TODO plants and seeds slowing performance. calculate seed landing cell and 
@@ -11,19 +9,31 @@ from ecosim.body import *
 
 
 class Entity:
+    '''
+    Entities keep their state in __slots__ rather than a __dict__, and state that is the same for
+    every instance of a class (name, texture, displayPriority, diet) is a class attribute. Every
+    subclass must declare __slots__, even if empty. tools/benchmark.py --only memory reports the
+    bytes used by each entity type.
+    '''
+    __slots__ = ('id', 'chunk', 'wakeAt', 'coords', 'processed', 'speed', 'speedBaseline')
+    name = 'Entity'
+    texture = None
+    displayPriority = 10
+
     def __init__(self, coords):
-        self.name = 'Entity'
+        self.id = None # assigned by the board's EntityRegistry
+        self.chunk = None # the chunk holding self on a chunked board
+        self.wakeAt = None # tick a dormant entity is run again on, see Board.sleepUntil
         self.coords = coords
         self.processed = True
-        self.texture = None
-        self.label = None
-        self.displayPriority = 10
         self.speed = 0
         self.speedBaseline = 0
         self.initializeSpeed()
         
     def generateParameter(self, base=100, variance=0):
-        return max(0, base + variance * uniform(-1, 1)) 
+        if variance == 0:
+            return max(0, base)
+        return max(0, base + variance * defaultStreams.placement.uniform(-1, 1)) 
 
     def initializeSpeed(self):
         self.speed = self.speedBaseline = self.generateParameter(0)
@@ -38,12 +48,20 @@ class Entity:
     def getStatus(self, board):
         pass
 
-    def randomizeMembers(self):
+    def randomizeMembers(self, rng):
         pass
 
     def simulate(self, board):
         pass
 
+    def fastForward(self, board, ticks, due=False):
+        '''
+        Catches up on ticks that were skipped while the chunk holding self was asleep. due is set
+        when self was dormant and its timer fired while the chunk slept, in which case the first of
+        the ticks is the one its timer came due on.
+        '''
+        pass
+
     def getCoordsAtDirection(self, direction, magnitude=1):
         '''
         Returns a tuple containing the new coords, with the row as the first element
@@ -127,92 +145,14 @@ class Entity:
             return False 
 
 
-class Particle(Entity): 
-    '''
-    Particles start at an altitude above ground level and float to adjacent cells until they hit the
-    ground. Particles behave independently of other entities and can therefore be simulated in parallel. 
-    '''
-    def __init__(self, coords, sourceClass, count=1000, diffusionRate=.1, decayRate=.1):
-        super().__init__(coords)
-        self.name = 'Particle'
-        self.sourceClass = sourceClass
-        self.count = count
-        self.diffusionRate = diffusionRate # the fraction of count that will diffuse to adjacent cells
-        self.decayRate = decayRate
-
-    def addToBoard(self, board, coords):
-        row, col = coords
-        board[row][col].particles.append(self)
-        board.entities.append(self)
-
-    def removeFromBoard(self, board, coords):
-        row, col = coords
-        board[row][col].particles.remove(self)
-        board.entities.remove(self)
-
-    @classmethod
-    def generate(cls, board, source, amount):
-        row, col = source.coords
-        cell = board[row][col]
-        for particle in cell.particles:
-            if particle.sourceClass == source.__class__:
-                particle.count += amount
-                return
-        newParticle = Particle(source.coords, source.__class__, amount)
-        cell.particles.append(newParticle)
-        board.entities.append(newParticle)
-
-    def transferOut(self, board, coords, amount):
-        if not board.validPosition(coords):
-                return
-        amount = min(amount, self.count)
-        self.count -= amount
-        row, col = coords 
-        cell = board[row][col]
-        for particle in cell.particles: 
-            if particle.sourceClass == self.sourceClass:
-                particle.count += amount
-                return
-        newParticle = Particle(coords, self.sourceClass, amount)  
-        newParticle.addToBoard(board, coords)    
-
-    def decay(self, board):
-        if self.count <= 0:
-            return
-        row, col = self.coords
-        self.count -= 5 + int(self.decayRate * self.count)
-
-    def diffuse(self, board):
-        if self.count <= 0:
-            return
-        row, col = self.coords
-        cell = board[row][col]
-        directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-        diffusingParticlesPerDirection = int(self.count * self.diffusionRate / len(directions)) 
-        self.count -= diffusingParticlesPerDirection * len(directions) 
-        for direction in directions:
-            adjCoords = self.getCoordsAtDirection(board, direction)
-            self.transferOut(board, adjCoords, diffusingParticlesPerDirection)                            
-    
-    def die(self, board):
-        row, col = self.coords
-        self.removeFromBoard(board, self.coords)
-
-    def simulate(self, board):
-        self.decay(board)
-        self.diffuse(board)
-
-    def getStatus(self, board):
-        if self.count <= 0:
-            self.die(board)
-
-
 class Organism(Entity):
-    def __init__(self, coords, generation=0, randomize=False):
+    __slots__ = ('generation', 'age', 'maturityAge', 'health', 'healthBaseline')
+    name = 'Organism'
+    displayPriority = 5
+
+    def __init__(self, coords, generation=0, randomize=False, rng=None):
         super().__init__(coords)
-        self.name = 'Organism'
         self.generation = generation
-        self.displayPriority = 5
         self.age = 0 # time steps
         self.maturityAge = 0
         self.health = 0
@@ -222,47 +162,58 @@ class Organism(Entity):
         self.speedBaseline = 0
         self.initializeSpeed()
         if randomize:
-            self.randomizeMembers()
+            self.randomizeMembers(rng or defaultStreams.placement)
 
     def initializeHealth(self):
         self.health = self.healthBaseline = self.generateParameter()
 
-    def randomizeMembers(self):
-        self.age = randint(0, 10)
+    def randomizeMembers(self, rng):
+        self.age = rng.randint(0, 10)
 
     def getStatus(self, board):
         if self.health <= 0:
             return self.die(board)
      
 
+unbred = object() # passed as the brain of offspring that Board.breedBrains gives a brain later
+
+
 class Animal(Organism):
-    def __init__(self, coords, generation=0, mass=50, massCapacity=100, randomize=False):
-        super().__init__(coords, generation, randomize)
-        self.name = 'Animal'
-        self.displayPriority = 1
-        self.diet = []
+    __slots__ = ('body', 'nose', 'brain', 'decision', 'strength', 'strengthBaseline', 'stepsToBreed', 'remainingStepsToBreed')
+    name = 'Animal'
+    displayPriority = 1
+    diet = () # classes the animal eats
+
+    def __init__(self, coords, generation=0, mass=50, massCapacity=100, randomize=False, rng=None, brain=None):
+        rng = rng or defaultStreams.placement
+        super().__init__(coords, generation, randomize, rng)
         self.body = AnimalBody(mass, massCapacity)
         self.nose = Nose()
-        self.brain = Brain()
+        if brain is unbred:
+            brain = None # set by Board.breedBrains before the offspring first decides
+        elif brain is None:
+            brain = Brain(rng.generator) # a random brain unless one is given
+        self.brain = brain
+        self.decision = None # set when the decision was made for the whole population at once
         self.strength = 0
         self.strengthBaseline = 0
         self.stepsToBreed = 6
         self.remainingStepsToBreed = 0
         self.resetStepsToBreed()
         if randomize:
-            self.randomizeMembers()
+            self.randomizeMembers(rng)
     
     def initializeStrength(self):
         self.strength = self.strengthBaseline = self.generateParameter()
 
-    def randomizeMembers(self):
-        self.body.stomachContentsMass = self.body.stomachCapacity * uniform(0, 1)
-        self.body.fatMassFraction = uniform(.15, .25)
-        self.body.muscleMassFraction = uniform(.30, .40)
+    def randomizeMembers(self, rng):
+        self.body.stomach.add(self.body.stomach.capacity * rng.uniform(0, 1), WHEAT_GRASS_ENERGY_CONTENT)
+        self.body.fatMassFraction = rng.uniform(.15, .25)
+        self.body.muscleMassFraction = rng.uniform(.30, .40)
 
     def getStatus(self, board):
         super().getStatus(board)
-        if self.body.starved():
+        if board.bodies is None and self.body.starved(): # otherwise starved animals die in Board.metabolize
             self.die(board)
 
     def decrementStepsToBreed(self):
@@ -273,20 +224,48 @@ class Animal(Organism):
         self.remainingStepsToBreed = self.stepsToBreed
 
     def simulate(self, board):
-        self.body.baselineEnergyExpenditure()
-        self.move(board)
-        self.body.metabolize()
+        if board.bodies is None: # otherwise the board metabolizes every animal at once
+            self.body.baselineEnergyExpenditure()
+            self.move(board)
+            self.body.metabolize()
+        else:
+            self.move(board)
         self.emanateScent(board)        
         self.age += 1
 
+    def sense(self, board):
+        '''
+        Returns the inputs to the brain.
+        '''
+        return self.nose.smell(self, board, Herbivore)
+
+    @staticmethod
+    def senseAll(animals, board):
+        '''
+        Returns the inputs to the brains of animals as an (n, 9) array, one row per animal, equal to
+        what sense returns for each.
+        '''
+        return Nose.smellAll(animals, board, Herbivore)
+
+    def decide(self, board):
+        '''
+        Returns the index of the action chosen by the brain. A decision already made for this
+        tick by Simulation.decideAll is used if there is one.
+        '''
+        if self.decision is not None:
+            decision, self.decision = self.decision, None
+            return decision
+        decision, value = max(enumerate(self.brain.decide(self.sense(board))), key=lambda p: p[1])
+        return decision
+
     def emanateScent(self, board):
-        Particle.generate(board, self, 75)
+        board.scent.emit(self.__class__, self.coords, 75)
 
     def move(self, board):
         possibleMoves = ['N', 'E', 'S', 'W']
         hasMoved = False
         while len(possibleMoves) > 0 and not hasMoved:
-            roll = randint(0, len(possibleMoves) - 1)
+            roll = board.rng.movement.randint(0, len(possibleMoves) - 1)
             direction = possibleMoves[roll]
             if not self.containsAnimal(board, direction) and self.validCell(board, direction):
                 self.moveInDirection(board, direction)
@@ -299,12 +278,12 @@ class Animal(Organism):
         directions = ['N', 'E', 'S', 'W']
         hasEaten = False
         while len(directions) > 0 and not hasEaten:
-            roll = randint(0, len(directions) - 1)
+            roll = board.rng.movement.randint(0, len(directions) - 1)
             direction = directions[roll]
             if self.checkForValidEntityFromList(board, direction, self.diet) and not self.containsAnimal(board, direction):
                 coords = self.getCoordsAtDirection(direction)
                 prey = board.getEntityOfClasses(coords, self.diet)
-                self.body.actionEnergyExpenditure(uniform(1, 3))
+                self.body.actionEnergyExpenditure(board.rng.movement.uniform(1, 3))
                 self.body.eat(prey)
                 prey.die(board)
                 self.moveInDirection(board, direction)
@@ -318,12 +297,12 @@ class Animal(Organism):
         if self.remainingStepsToBreed <= 0 and self.body.canReproduce() and self.age >= self.maturityAge:     
             possibleSpaces = ['N', 'E', 'S', 'W']
             while len(possibleSpaces) > 0 and not hasBred:
-                roll = randint(0, len(possibleSpaces) - 1)
+                roll = board.rng.breeding.randint(0, len(possibleSpaces) - 1)
                 direction = possibleSpaces[roll]
                 if not self.containsAnimal(board, direction) and self.validCell(board, direction):
                     coords = board.getCoordsAtDirection(direction)
                     self.breed(board, coords)
-                    self.body.actionEnergyExpenditure(uniform(2, 4))
+                    self.body.actionEnergyExpenditure(board.rng.breeding.uniform(2, 4))
                     hasBred = True
                 else:
                     possibleSpaces.remove(direction)
@@ -333,33 +312,33 @@ class Animal(Organism):
         return hasBred
     
     def breed(self, board, coords):
-        newAnimal = self.__class__(coords, self.generation + 1)
-        newAnimal.brain = deepcopy(self.brain)
-        newAnimal.brain.mutate()
+        newAnimal = self.__class__(coords, self.generation + 1, rng=board.rng.breeding, brain=self.brain.clone())
+        newAnimal.brain.mutate(board.rng.mutation.generator)
         board.addEntity(newAnimal, coords)
 
 
 class Herbivore(Animal):
-    def __init__(self, coords, generation=0, mass=40, massCapacity=60, randomize=False):
-        super().__init__(coords, generation, mass, massCapacity, randomize)
-        self.name ='Herbivore'
-        self.texture = 'assets/blueCircle.png'
-        self.diet.append(Plant)
+    __slots__ = ()
+    name = 'Herbivore'
+    texture = 'assets/blueCircle.png'
+    # diet is (Plant,), set after the Plant class
+
+    def __init__(self, coords, generation=0, mass=40, massCapacity=60, randomize=False, rng=None, brain=None):
+        rng = rng or defaultStreams.placement
+        super().__init__(coords, generation, mass, massCapacity, randomize, rng, brain)
         self.maturityAge = 15
-        self.stepsToBreed = randint(8, 12)
+        self.stepsToBreed = rng.randint(8, 12)
 
     def move(self, board):
-        scents = self.nose.smell(self, board, Herbivore)
-        decision, value = max(enumerate(self.brain.decide(scents)), key=lambda p: p[1])
+        decision = self.decide(board)
         if not decision == 4:
-            self.body.actionEnergyExpenditure(uniform(.25, .4))  # caloric penalty for searching for a valid move if not necessary
+            self.body.actionEnergyExpenditure(board.rng.movement.uniform(.25, .4))  # caloric penalty for searching for a valid move if not necessary
             directions = ['N', 'E', 'S', 'W']
             direction = directions[decision]
             coords = board.getCoordsAtDirection(self.coords, direction)
             if board.validPosition(coords) and not board.cellContains(coords, self.__class__):
-                self.body.actionEnergyExpenditure(uniform(.6, 1))
+                self.body.actionEnergyExpenditure(board.rng.movement.uniform(.6, 1))
                 self.moveInDirection(board, direction) 
-                self.label.raise_()   
         if self.body.hungry():
             self.attemptToEat(board)     
         self.attemptToBreed(board)
@@ -372,7 +351,7 @@ class Herbivore(Animal):
         mate = None
         hasBred = False
         while len(directions) > 0 and not mate:
-            direction = directions[randint(0, len(directions) - 1)]
+            direction = directions[board.rng.breeding.randint(0, len(directions) - 1)]
             coordsAtDirection = board.getCoordsAtDirection(self.coords, direction)
             if not board.validPosition(coordsAtDirection):
                 directions.remove(direction)
@@ -386,7 +365,7 @@ class Herbivore(Animal):
         if mate:
             spawnCoords = board.searchForEmptySpace(self.coords) or board.searchForEmptySpace(mate.coords)
             if spawnCoords:
-                self.body.actionEnergyExpenditure(uniform(2, 4))
+                self.body.actionEnergyExpenditure(board.rng.breeding.uniform(2, 4))
                 self.breed(board, mate, spawnCoords)
                 self.resetStepsToBreed()
                 mate.resetStepsToBreed()
@@ -396,9 +375,8 @@ class Herbivore(Animal):
 
     def breed(self, board, mate, coords):
         board.herbivores += 1
-        newAnimal = self.__class__(coords, self.generation + 1)
-        newAnimal.brain.neuralNetwork.weights = self.brain.inheritance(mate.brain)
-        newAnimal.brain.mutate()
+        newAnimal = self.__class__(coords, self.generation + 1, rng=board.rng.breeding, brain=unbred)
+        board.births.append((newAnimal, self, mate))
         board.addEntity(newAnimal, coords)
 
     def attemptToEat(self, board):
@@ -413,31 +391,33 @@ class Herbivore(Animal):
         if self.age > board.oldestHerbivore:
             board.oldestHerbivore = self.age
             board.creatureTemplate = self
+        board.recordElite(self)
         super().die(board)
         board.herbivores -= 1
 
 
 class Carnivore(Animal):
-    def __init__(self, coords, generation=0, mass=50, massCapacity=200, randomize=False):
-        super().__init__(coords, generation, mass, massCapacity, randomize)
-        self.name = 'Carnivore'
-        self.texture = 'assets/orangeCircle.png'
-        self.diet.append(Herbivore)
+    __slots__ = ()
+    name = 'Carnivore'
+    texture = 'assets/orangeCircle.png'
+    diet = (Herbivore,)
+
+    def __init__(self, coords, generation=0, mass=50, massCapacity=200, randomize=False, rng=None, brain=None):
+        rng = rng or defaultStreams.placement
+        super().__init__(coords, generation, mass, massCapacity, randomize, rng, brain)
         self.maturityAge = 13
-        self.stepsToBreed = randint(10, 15)
+        self.stepsToBreed = rng.randint(10, 15)
 
     def move(self, board):
-        scents = self.nose.smell(self, board, Herbivore)
-        decision, value = max(enumerate(self.brain.decide(scents)), key=lambda p: p[1])
+        decision = self.decide(board)
         if not decision == 4:
-            self.body.actionEnergyExpenditure(uniform(.25, .4))  # caloric penalty for searcing for a valid move if not necessary
+            self.body.actionEnergyExpenditure(board.rng.movement.uniform(.25, .4))  # caloric penalty for searcing for a valid move if not necessary
             directions = ['N', 'E', 'S', 'W']
             direction = directions[decision]
             coords = board.getCoordsAtDirection(self.coords, direction)
             if board.validPosition(coords) and not board.cellContains(coords, self.__class__):
-                self.body.actionEnergyExpenditure(uniform(.6, 1))
+                self.body.actionEnergyExpenditure(board.rng.movement.uniform(.6, 1))
                 self.moveInDirection(board, direction) 
-                self.label.raise_()
         if self.body.hungry():
             self.attemptToEat(board)       
         self.attemptToBreed(board)
@@ -455,7 +435,7 @@ class Carnivore(Animal):
     def attemptToEat(self, board):
         if board.cellContains(self.coords, Herbivore):
             prey = board.getEntityOfClass(self.coords, Herbivore)
-            self.body.actionEnergyExpenditure(uniform(1, 3))
+            self.body.actionEnergyExpenditure(board.rng.movement.uniform(1, 3))
             self.body.eat(prey)
             prey.die(board)
             return True
@@ -463,43 +443,88 @@ class Carnivore(Animal):
 
 
 class Plant(Organism):
+    __slots__ = ('body', 'germinationChance', 'seeding')
+    name = 'Plant'
+    texture = 'assets/plant.png'
+
     def __init__(self, coords, generation=0, mass=1, massCapacity=35, germinationChance=30):
         super().__init__(coords, generation)
-        self.name = 'Plant'
-        self.displayPriority = 5
-        self.texture = 'assets/plant.png'
         self.body = PlantBody(mass, massCapacity)
         self.germinationChance = germinationChance
+        self.seeding = False # set once fully grown, when the plant only wakes to spread seeds
 
     def simulate(self, board):
-        self.spreadSeeds(board)
-        self.body.grow()
+        if self.seeding:
+            self.disperseSeed(board)
+        else:
+            self.spreadSeeds(board)
+            self.body.grow()
+        if self.body.mass >= self.body.massCapacity:
+            # a fully grown plant only spreads seeds, so it sleeps until the next tick it does
+            self.seeding = True
+            board.sleepUntil(self, board.tick + int(board.rng.dispersal.generator.geometric(.05)))
+
+    def fastForward(self, board, ticks, due=False):
+        # growth has a closed form; the seeds spread while asleep are replayed now
+        self.body.growFor(ticks)
+        if due: # its timer fired while its chunk slept, so the seed due on its first tick is certain
+            self.disperseSeed(board)
+            ticks -= 1
+        for i in range(board.rng.dispersal.generator.binomial(ticks, .05)):
+            self.disperseSeed(board)
+        if due: # seeding plants only wake for their seeds, so it sleeps until its next one
+            board.sleepUntil(self, board.tick + int(board.rng.dispersal.generator.geometric(.05)))
 
     def spreadSeeds(self, board):
-        if randint(1, 100) <= 5:
-            directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-            direction = directions[randint(0, len(directions) - 1)]
-            magnitude = randint(1, 10)
-            coords = self.getCoordsAtDirection(direction, magnitude)
-            if board.validPosition(coords):
-                if not board.cellContains(coords, Plant) and not board.cellContains(coords, Seed):
-                    board.addEntity(Seed(coords, self.generation + 1, randint(12, 26)), coords)
-    
+        if board.rng.dispersal.randint(1, 100) <= 5:
+            self.disperseSeed(board)
+
+    def disperseSeed(self, board):
+        rng = board.rng.dispersal
+        directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+        direction = directions[rng.randint(0, len(directions) - 1)]
+        magnitude = rng.randint(1, 10)
+        coords = self.getCoordsAtDirection(direction, magnitude)
+        if board.validPosition(coords):
+            if not board.cellContains(coords, Plant) and not board.cellContains(coords, Seed):
+                board.addEntity(Seed(coords, self.generation + 1, rng.randint(12, 26)), coords)
+
+
+Herbivore.diet = (Plant,) # set here rather than in Herbivore, which is defined before Plant
+
 
 class Seed(Organism):
+    __slots__ = ('daysToSprout',)
+    name = 'Seed'
+
     def __init__(self, coords, generation=0, daysToSprout=6):
         super().__init__(coords, generation)
-        self.name = 'Seed'
         self.daysToSprout = daysToSprout
 
     def simulate(self, board):
         if self.daysToSprout > 0:
-            self.daysToSprout -= 1
-        elif randint(1, 100) <= 5:
+            # sleep through the countdown, waking on the tick it would have reached 0
+            board.sleepUntil(self, board.tick + self.daysToSprout)
+            self.daysToSprout = 0
+        elif board.rng.dispersal.randint(1, 100) <= 5:
             self.die(board)
         else:
             self.sprout(board)
+
+    def fastForward(self, board, ticks, due=False):
+        # a due seed has finished its countdown, so it dies or sprouts on the first of the ticks
+        if ticks <= self.daysToSprout:
+            self.daysToSprout -= ticks
+            return
+        # the seed either died or sprouted on the tick after its countdown ran out
+        ticks -= self.daysToSprout + 1
+        self.daysToSprout = 0
+        if board.rng.dispersal.randint(1, 100) <= 5:
+            self.die(board)
+        else:
+            self.sprout(board).fastForward(board, ticks)
                 
     def sprout(self, board):
-        board.replaceEntity(self, Plant(self.coords, self.generation, 10))
-    
+        plant = Plant(self.coords, self.generation, 10)
+        board.replaceEntity(self, plant)
+        return plant
@@ -0,0 +1,39 @@
+import numpy as np
+
+from ecosim.entities import Plant
+from ecosim.plants import PlantLayer
+
+plantLayerSample = Plant(None) # texture and displayPriority of the plants in a PlantLayer
+
+
+class Frame:
+    '''
+    A picture of the board at the end of a tick, as plain arrays with no references to the board.
+    layers is a list of (texture, coords) pairs in the order they are painted: coords is an
+    (n, 2) array of the (row, col) of every cell the texture is drawn in. Entities with a lower
+    displayPriority are painted later, so they appear on top.
+    '''
+    def __init__(self, rows, cols, layers, round=0, iteration=0):
+        self.rows = rows
+        self.cols = cols
+        self.layers = layers
+        self.round = round
+        self.iteration = iteration
+
+    @classmethod
+    def fromBoard(cls, board, round=0, iteration=0):
+        groups = {} # (displayPriority, texture) -> coords
+        for entity in board.entities:
+            if entity.texture and entity.coords is not None:
+                groups.setdefault((entity.displayPriority, entity.texture), []).append(entity.coords)
+        layers = [(texture, np.array(coords, dtype=np.int32).reshape(-1, 2)) for (priority, texture), coords in groups.items()]
+        priorities = [priority for priority, texture in groups]
+        if board.plants is not None:
+            layers.append((plantLayerSample.texture, np.argwhere(board.plants.state == PlantLayer.PLANT).astype(np.int32)))
+            priorities.append(plantLayerSample.displayPriority)
+        order = sorted(range(len(layers)), key=lambda i: -priorities[i])
+        return cls(board.rows, board.cols, [layers[i] for i in order], round, iteration)
+
+    @property
+    def textures(self):
+        return [texture for texture, coords in self.layers]
@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+
+defaultGenerator = np.random.default_rng()
+
+
+def layerViews(buffer, shapes):
+    '''
+    Returns views of consecutive slices of the last axis of buffer reshaped to shapes. buffer can
+    be one flat genome or a 2D array with one genome per row.
+    '''
+    views = []
+    offset = 0
+    leading = buffer.shape[:-1]
+    for shape in shapes:
+        size = math.prod(shape)
+        if len(leading) == 0:
+            views.append(buffer[offset:offset + size].reshape(shape))
+        else:
+            views.append(buffer[..., offset:offset + size].reshape(leading + tuple(shape)))
+        offset += size
+    return views
+
+
+class Genome:
+    '''
+    The weights of a network in one contiguous flat buffer. layers holds a view of the buffer for
+    each weight matrix, so a genome is cloned with a single array copy. shapes is a tuple shared
+    by the clones of a genome.
+    '''
+    __slots__ = ('shapes', 'buffer', 'layers')
+
+    def __init__(self, shapes, buffer=None):
+        self.shapes = shapes if type(shapes) is tuple else tuple(tuple(shape) for shape in shapes)
+        if buffer is None:
+            buffer = np.empty(sum(math.prod(shape) for shape in self.shapes))
+        self.buffer = buffer
+        self.layers = layerViews(buffer, self.shapes)
+
+    @classmethod
+    def fromLayers(cls, layers):
+        return cls([layer.shape for layer in layers], np.concatenate([np.ravel(layer) for layer in layers]))
+
+    @property
+    def size(self):
+        return self.buffer.size
+
+    def clone(self):
+        return Genome(self.shapes, self.buffer.copy())
+
+    def __deepcopy__(self, memo):
+        return self.clone()
+
+
+def mutate(weights, rng, mutationChance=.03, variance=.05):
+    '''
+    Mutates weights in place and returns them. Each weight has a mutationChance of being replaced
+    by a random value between -1 and 1, then every weight is shifted by a random amount of up to
+    half of variance times its own value. weights can be a single matrix or a stack of matrices.
+    '''
+    replaced = rng.random(weights.shape) < mutationChance
+    weights[replaced] = rng.uniform(-1, 1, np.count_nonzero(replaced))
+    weights += weights * variance * rng.uniform(-.5, .5, weights.shape)
+    return weights
+
+
+def crossover(first, second, rng):
+    '''
+    Returns a new array in which each row is taken from first or second with equal probability.
+    first and second can be stacks of matrices with one pair of parents per leading index.
+    '''
+    fromFirst = rng.random(first.shape[:-1] + (1,)) < .5
+    return np.where(fromFirst, first, second)
+
+
+def diversity(genomes):
+    '''
+    Returns the mean over all weights of the standard deviation of that weight across genomes, a
+    2D array with one flat genome per row. Identical genomes have a diversity of 0.
+    '''
+    genomes = np.asarray(genomes)
+    if len(genomes) < 2:
+        return 0.0
+    return float(np.mean(np.std(genomes, axis=0)))
+
+
+def breed(firstParents, secondParents, rng):
+    '''
+    Crosses over and mutates a batch of parent pairs. firstParents and secondParents are lists
+    with one stacked array per network layer. Returns the offspring weights in the same layout.
+    '''
+    return [mutate(crossover(first, second, rng), rng) for first, second in zip(firstParents, secondParents)]
@@ -3,8 +3,18 @@ from PyQt5.QtGui import *
 from PyQt5.QtCore import QTimer
 from PyQt5.QtCore import Qt
 
-class Window(QMainWindow):
-    def __init__(self, left=50, top=50, width=1200, height=800):
+from ecosim.observer import Observer
+from ecosim.runner import Runner
+
+
+class Window(QMainWindow, Observer):
+    '''
+    Renders a Simulation that a Runner steps on a background thread. Attach with Simulation.attach.
+    A QTimer draws the latest published Frame frameRate times a second in one paint pass: the grass
+    is prerendered into a single pixmap, and each texture is loaded from disk once. Space pauses,
+    the right arrow steps one tick and F toggles fast-forward.
+    '''
+    def __init__(self, left=50, top=50, width=1200, height=800, frameRate=30):
         super().__init__()
         self.setWindowTitle('EcoSim')
         self.left = left
@@ -14,41 +24,90 @@ class Window(QMainWindow):
         self.leftMargin = 50
         self.topMargin = 50
         self.tileSize = 32
+        self.frameRate = frameRate
         self.qTimer = QTimer()
+        self.runner = None
+        self.pixmaps = {} # texture path -> QPixmap
+        self.background = None
+        self.frame = None
         self.setGeometry(self.left, self.top, self.width, self.height)
-        
-    def startTimer(self, simulation, function):
-        self.qTimer.setInterval(simulation.waitBetweenRounds * 1000)
+        self.createControls()
+
+    def attach(self, simulation):
+        self.createBackground(simulation.board.rows, simulation.board.cols)
+        self.runner = Runner(simulation, simulation.waitBetweenRounds)
+        self.showFrame(self.runner.frame)
+        self.startTimer(1 / self.frameRate, self.refresh)
+        self.runner.start()
+
+    def startTimer(self, interval, function):
+        self.qTimer.setInterval(int(interval * 1000))
         self.qTimer.timeout.connect(function)
         self.qTimer.start()
 
-    def createBackground(self, rows, cols):
-        pixmap = QPixmap('assets/grass.png')
-        for row in range(rows):
-            top = row * self.tileSize + self.topMargin
-            for col in range(cols):
-                label = QLabel(self)
-                label.setPixmap(pixmap)
-                left = col * self.tileSize + self.leftMargin
-                label.setGeometry(left, top, self.tileSize, self.tileSize)
-
-    def addEntity(self, entity):
-        if not entity.texture:
-            return
-        row, col = entity.coords
-        pixmap = QPixmap(entity.texture)
-        entity.label = QLabel(self)
-        entity.label.setPixmap(pixmap)
-        left = col * self.tileSize + self.leftMargin
-        top = row * self.tileSize + self.topMargin
-        entity.label.setGeometry(left, top, self.tileSize, self.tileSize)
-        entity.label.show()
-
-    def moveEntity(self, entity):
-        if not entity.label:
+    def createControls(self):
+        toolbar = self.addToolBar('Simulation')
+        self.pauseAction = toolbar.addAction('Pause')
+        self.pauseAction.setCheckable(True)
+        self.pauseAction.setShortcut(Qt.Key_Space)
+        self.pauseAction.toggled.connect(lambda paused: self.runner and self.runner.setPaused(paused))
+        self.stepAction = toolbar.addAction('Step')
+        self.stepAction.setShortcut(Qt.Key_Right)
+        self.stepAction.triggered.connect(self.step)
+        self.fastForwardAction = toolbar.addAction('Fast forward')
+        self.fastForwardAction.setCheckable(True)
+        self.fastForwardAction.setShortcut(Qt.Key_F)
+        self.fastForwardAction.toggled.connect(lambda fastForward: self.runner and self.runner.setFastForward(fastForward))
+
+    def step(self):
+        if self.runner is None:
             return
-        row, col = entity.coords
-        left = col * self.tileSize + self.leftMargin
-        top = row * self.tileSize + self.topMargin
-        entity.label.move(left, top)
+        self.pauseAction.setChecked(True)
+        self.runner.step()
 
+    def refresh(self):
+        '''
+        Shows the latest frame published by the runner, if it is new.
+        '''
+        frame = self.runner.frame
+        if frame is not self.frame:
+            self.showFrame(frame)
+            self.statusBar().showMessage('Round {}  Tick {}'.format(frame.round, frame.iteration))
+
+    def closeEvent(self, event):
+        if self.runner is not None:
+            self.runner.stop(1) # keeps closing responsive, whoever closes the observers waits for the rest
+        super().closeEvent(event)
+
+    def pixmap(self, texture):
+        pixmap = self.pixmaps.get(texture)
+        if pixmap is None:
+            pixmap = self.pixmaps[texture] = QPixmap(texture)
+        return pixmap
+
+    def createBackground(self, rows, cols):
+        '''
+        Tiles the grass texture into one pixmap covering the whole board.
+        '''
+        self.background = QPixmap(cols * self.tileSize, rows * self.tileSize)
+        grass = self.pixmap('assets/grass.png')
+        painter = QPainter(self.background)
+        painter.drawTiledPixmap(0, 0, self.background.width(), self.background.height(), grass)
+        painter.end()
+
+    def showFrame(self, frame):
+        self.frame = frame
+        self.update()
+
+    def paintEvent(self, event):
+        if self.background is None or self.frame is None:
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(self.leftMargin, self.topMargin, self.background)
+        for texture, coords in self.frame.layers:
+            pixmap = self.pixmap(texture)
+            lefts = (coords[:, 1] * self.tileSize + self.leftMargin).tolist()
+            tops = (coords[:, 0] * self.tileSize + self.topMargin).tolist()
+            for left, top in zip(lefts, tops):
+                painter.drawPixmap(left, top, pixmap)
+        painter.end()
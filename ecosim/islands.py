@@ -0,0 +1,209 @@
+'''
+Island-model evolution: every process evolves its own population, and every few rounds each
+island publishes the genomes of its longest lived herbivores for the next island in the ring. Genomes
+are exchanged through a shared-memory buffer rather than by pickling brains, and islands never wait
+for each other. Which genomes an island receives therefore depends on how fast the islands run,
+so island runs are not reproducible from their seed, even though each island is seeded.
+
+    python -m ecosim.islands --islands 8 --rounds 40 --interval 4 --output islands.json
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ecosim.simulation import Simulation
+from ecosim.observer import Observer
+from ecosim.body import Brain
+from ecosim.neural_network import NeuralNetwork
+from ecosim.parallel import ExperimentResults, RoundRecorder, Task
+from ecosim import genetics
+
+
+class GenomeBuffer:
+    '''
+    Holds the latest elite genomes published by every island in shared memory, as a
+    (islands, eliteSize, genomeSize + 1) float array. Column 0 of each row holds the age of the
+    herbivore the genome came from, or -1 if the row is empty. Each island only writes its own
+    slot, and a per-slot version counter lets readers detect and retry torn reads, so no island
+    ever waits for another.
+    '''
+    def __init__(self, islands, eliteSize, genomeSize, name=None):
+        self.shape = (islands, eliteSize, genomeSize + 1)
+        headerSize = islands * np.dtype(np.int64).itemsize
+        size = headerSize + int(np.prod(self.shape)) * np.dtype(np.float64).itemsize
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.versions = np.ndarray((islands,), dtype=np.int64, buffer=self.memory.buf) # odd while a slot is being written
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf, offset=headerSize)
+        if self.owner:
+            self.versions[:] = 0
+            self.array[:, :, 0] = -1
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def write(self, island, ages, genomes):
+        slot = self.array[island]
+        self.versions[island] += 1
+        slot[:, 0] = -1
+        slot[:len(ages), 0] = ages
+        slot[:len(genomes), 1:] = genomes
+        self.versions[island] += 1
+
+    def read(self, island):
+        '''
+        Returns the version of island's slot and copies of the ages and genomes stored in it.
+        '''
+        while True:
+            version = int(self.versions[island])
+            if version % 2 == 0:
+                slot = self.array[island].copy()
+                if int(self.versions[island]) == version:
+                    filled = slot[:, 0] >= 0
+                    return version, slot[filled, 0], slot[filled, 1:]
+            time.sleep(0)
+
+    def close(self):
+        del self.versions
+        del self.array
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class Migration(Observer):
+    '''
+    Every interval rounds, publishes the elite genomes of this island and adds the latest elite
+    published by the previous island in the ring to the templates of the next round. Genomes that
+    were already received are not added again.
+    '''
+    def __init__(self, island, islands, buffer, interval):
+        self.island = island
+        self.islands = islands
+        self.buffer = buffer
+        self.interval = interval
+        self.lastVersion = 0
+        self.migrations = 0
+
+    def roundEnded(self, simulation):
+        if self.islands < 2 or simulation.round % self.interval != 0:
+            return
+        elite = simulation.board.elite
+        self.buffer.write(self.island, [herbivore.age for herbivore in elite], [herbivore.brain.neuralNetwork.genome() for herbivore in elite])
+        version, ages, genomes = self.buffer.read((self.island - 1) % self.islands)
+        if version == self.lastVersion:
+            return
+        self.lastVersion = version
+        for genome in genomes:
+            simulation.immigrants.append(Brain.fromGenome(genome))
+        self.migrations += 1
+
+
+def runIsland(island, islands, task, bufferName, bufferShape, interval, queue):
+    '''
+    Evolves one island and puts its results on queue. If anything fails, (island, exception) is
+    put on queue instead, so the parent never waits for an island that will not report.
+    '''
+    buffer = None
+    try:
+        buffer = GenomeBuffer(*bufferShape, name=bufferName)
+        recorder = RoundRecorder(task.seed)
+        migration = Migration(island, islands, buffer, interval)
+        simulation = Simulation(seed=task.seed, observers=[recorder, migration], **task.config)
+        ticks = 0
+        while len(recorder.results) < task.rounds and ticks < task.maxTicks:
+            simulation.tick()
+            ticks += 1
+        if len(recorder.results) < task.rounds:
+            recorder.results.append(recorder.record(simulation, False))
+        templates = [brain.neuralNetwork.genome() for brain in simulation.board.templates]
+        queue.put((island, task, recorder.results, migration.migrations, genetics.diversity(templates)))
+    except Exception as error:
+        queue.put((island, error))
+        raise
+    finally:
+        if buffer is not None:
+            buffer.close()
+
+
+class IslandResults(ExperimentResults):
+    def __init__(self):
+        super().__init__()
+        self.islands = {} # island -> migrations completed and diversity of the templates of its last round
+
+    def summary(self):
+        summary = super().summary()
+        best = [result.genome for result in self.bestGenomes(len(self.rounds))]
+        summary['islands'] = self.islands
+        summary['bestGenomeDiversity'] = genetics.diversity([np.concatenate([layer.ravel() for layer in genome]) for genome in best])
+        return summary
+
+
+def runIslands(islands=None, rounds=20, interval=2, eliteSize=5, maxTicks=100000, seed=0, config=None, timeout=None):
+    '''
+    Runs one island per process, by default one per core, and returns their IslandResults.
+    Island i is seeded with (seed, i).
+    '''
+    islands = islands or os.cpu_count()
+    config = dict(config or {}, eliteSize=eliteSize)
+    genomeSize = NeuralNetwork().genome().size
+    buffer = GenomeBuffer(islands, eliteSize, genomeSize)
+    queue = multiprocessing.Queue()
+    processes = []
+    try:
+        for island in range(islands):
+            task = Task((seed, island), rounds, maxTicks, config)
+            process = multiprocessing.Process(target=runIsland, args=(island, islands, task, buffer.name, (islands, eliteSize, genomeSize), interval, queue))
+            process.start()
+            processes.append(process)
+        results = IslandResults()
+        finished = []
+        for process in processes:
+            item = queue.get(timeout=timeout)
+            if isinstance(item[1], Exception):
+                raise RuntimeError('island {} failed'.format(item[0])) from item[1]
+            finished.append(item)
+        for island, task, rounds, migrations, diversity in sorted(finished, key=lambda item: item[0]):
+            results.add(task, rounds)
+            results.islands[island] = {'migrations': migrations, 'templateDiversity': diversity}
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        buffer.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run island-model ecosim evolution.')
+    parser.add_argument('--islands', type=int, default=os.cpu_count())
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--interval', type=int, default=2, help='rounds between migrations')
+    parser.add_argument('--elite', type=int, default=5, help='genomes kept and sent by each island')
+    parser.add_argument('--max-ticks', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rows', type=int, default=30)
+    parser.add_argument('--cols', type=int, default=40)
+    parser.add_argument('--batch-decisions', action='store_true')
+    parser.add_argument('--plant-layer', action='store_true')
+    parser.add_argument('--batch-physiology', action='store_true')
+    parser.add_argument('--output', default='misc/island_results.json')
+    args = parser.parse_args(argv)
+
+    config = {'rows': args.rows, 'cols': args.cols, 'batchDecisions': args.batch_decisions, 'plantLayer': args.plant_layer,
+              'batchPhysiology': args.batch_physiology}
+    results = runIslands(args.islands, args.rounds, args.interval, args.elite, args.max_ticks, args.seed, config)
+    results.toJSON(args.output)
+    print(json.dumps(results.summary(), indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+'''
+Records statistics of a simulation every tick and every round. Values are appended to columnar
+buffers, and full buffers are written by a background thread, so nothing on the simulation thread
+opens files or prints:
+
+    metrics = Metrics(tickSink=CSVSink('misc/ticks.csv', Metrics.tickColumns))
+    simulation = Simulation(observers=[metrics])
+    simulation.advance(1000)
+    metrics.close()
+    herbivores = metrics.ticks()['herbivores']
+'''
+import csv
+import json
+import os
+import queue
+import threading
+from collections import Counter
+
+import numpy as np
+
+from ecosim.observer import Observer
+from ecosim.entities import Animal, Herbivore, Carnivore, Plant, Seed
+from ecosim import genetics
+
+
+class ColumnBuffer:
+    '''
+    Holds up to capacity rows as one float64 array per column.
+    '''
+    def __init__(self, columns, capacity=1024):
+        self.columns = columns
+        self.capacity = capacity
+        self.arrays = [np.empty(capacity) for column in columns]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def full(self):
+        return self.size == self.capacity
+
+    def append(self, values):
+        for array, value in zip(self.arrays, values):
+            array[self.size] = value
+        self.size += 1
+
+    def view(self):
+        '''
+        Returns the filled part of every column, without copying.
+        '''
+        return {column: array[:self.size] for column, array in zip(self.columns, self.arrays)}
+
+    def take(self):
+        '''
+        Returns the filled part of every column and starts a new, empty buffer.
+        '''
+        batch = self.view()
+        self.arrays = [np.empty(self.capacity) for column in self.columns]
+        self.size = 0
+        return batch
+
+
+class CSVSink:
+    def __init__(self, path, columns):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.columns = columns
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, batch):
+        self.writer.writerows(zip(*[batch[column].tolist() for column in self.columns]))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ColumnSink:
+    '''
+    Appends every column to its own file of raw float64 values in directory. Read the columns
+    back with loadColumns.
+    '''
+    def __init__(self, directory, columns):
+        os.makedirs(directory, exist_ok=True)
+        self.columns = columns
+        with open(os.path.join(directory, 'columns.json'), 'w') as schemaFile:
+            json.dump({'columns': columns, 'dtype': '<f8'}, schemaFile)
+        self.files = [open(os.path.join(directory, column + '.f8'), 'wb') for column in columns]
+
+    def write(self, batch):
+        for column, columnFile in zip(self.columns, self.files):
+            batch[column].astype('<f8', copy=False).tofile(columnFile)
+            columnFile.flush()
+
+    def close(self):
+        for columnFile in self.files:
+            columnFile.close()
+
+
+def loadColumns(directory):
+    with open(os.path.join(directory, 'columns.json')) as schemaFile:
+        schema = json.load(schemaFile)
+    return {column: np.fromfile(os.path.join(directory, column + '.f8'), dtype=schema['dtype']) for column in schema['columns']}
+
+
+class BackgroundWriter:
+    '''
+    Writes batches to sink on a daemon thread, in the order they were submitted.
+    '''
+    def __init__(self, sink):
+        self.sink = sink
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.loop, name='metrics', daemon=True)
+        self.thread.start()
+
+    def submit(self, batch):
+        self.queue.put(batch)
+
+    def loop(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            self.sink.write(batch)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.sink.close()
+
+
+class Series:
+    '''
+    A ColumnBuffer whose full batches are kept for analysis and handed to an optional sink.
+    '''
+    def __init__(self, columns, sink=None, batchSize=1024, keep=True):
+        self.columns = columns
+        self.buffer = ColumnBuffer(columns, batchSize)
+        self.writer = BackgroundWriter(sink) if sink is not None else None
+        self.keep = keep
+        self.batches = []
+
+    def append(self, values):
+        self.buffer.append(values)
+        if self.buffer.full:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        batch = self.buffer.take()
+        if self.keep:
+            self.batches.append(batch)
+        if self.writer is not None:
+            self.writer.submit(batch)
+
+    def columnsSoFar(self):
+        '''
+        Returns every recorded value of every column, including those not yet flushed.
+        '''
+        batches = self.batches + [self.buffer.view()]
+        return {column: np.concatenate([batch[column] for batch in batches]) for column in self.columns}
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Metrics(Observer):
+    '''
+    Records per-tick population statistics and per-round results. Entity counts, the total and
+    maximum generation of the animals and the age of the oldest one are kept up to date from the add
+    and remove notifications of the board: every animal on the board ages by one each tick, so its
+    age minus the number of ticks ended is fixed, and the oldest animal is the one for which it is
+    largest. Mass and fat change for every animal every tick. With batchPhysiology they are summed
+    from the columns of the board's BodyPool, and otherwise by a scan over the animals, which is
+    O(animals) per tick. Brain diversity, the costliest column, is computed every diversityInterval
+    ticks (NaN in between).
+    '''
+    tickColumns = ['round', 'tick', 'herbivores', 'carnivores', 'plants', 'seeds', 'meanMass', 'meanFatFraction',
+                   'meanGeneration', 'maxGeneration', 'oldestAge', 'scent', 'diversity']
+    roundColumns = ['round', 'duration', 'oldestAge', 'generation', 'eliteDiversity']
+
+    def __init__(self, tickSink=None, roundSink=None, batchSize=1024, diversityInterval=10, keep=True):
+        self.tickSeries = Series(self.tickColumns, tickSink, batchSize, keep)
+        self.roundSeries = Series(self.roundColumns, roundSink, batchSize, keep)
+        self.diversityInterval = diversityInterval
+        self.counts = {Herbivore: 0, Carnivore: 0, Plant: 0, Seed: 0}
+        self.animals = {} # id -> animal on the board
+        self.generationTotal = 0
+        self.generations = Counter() # generation -> animals of it on the board
+        self.maxGeneration = 0
+        self.ticksEnded = 0
+        self.ageOffsets = {} # id -> age of the animal minus ticksEnded, fixed while it is on the board
+        self.offsetCounts = Counter()
+        self.oldestOffset = None # the largest value in ageOffsets, that of the oldest animal
+
+    def attach(self, simulation):
+        self.clear()
+        for entity in simulation.board.entities:
+            self.addEntity(entity, runsNext=True)
+
+    def clear(self):
+        for cls in self.counts:
+            self.counts[cls] = 0
+        self.animals.clear()
+        self.generationTotal = 0
+        self.generations.clear()
+        self.maxGeneration = 0
+        self.ageOffsets.clear()
+        self.offsetCounts.clear()
+        self.oldestOffset = None
+
+    def addEntity(self, entity, runsNext=False):
+        '''
+        Counts entity. Entities added during a tick are not run until the tick after, while
+        runsNext is set for those already on the board between ticks, which run in the next one.
+        '''
+        cls = entity.__class__
+        if cls in self.counts:
+            self.counts[cls] += 1
+        if isinstance(entity, Animal):
+            self.animals[entity.id] = entity
+            self.generationTotal += entity.generation
+            self.generations[entity.generation] += 1
+            self.maxGeneration = max(self.maxGeneration, entity.generation)
+            offset = self.ageOffsets[entity.id] = entity.age - self.ticksEnded + (1 if runsNext else 0)
+            self.offsetCounts[offset] += 1
+            if self.oldestOffset is None or offset > self.oldestOffset:
+                self.oldestOffset = offset
+
+    def removeEntity(self, entity):
+        cls = entity.__class__
+        if cls in self.counts:
+            self.counts[cls] -= 1
+        if self.animals.pop(entity.id, None) is not None:
+            self.generationTotal -= entity.generation
+            if self.discount(self.generations, entity.generation) and entity.generation == self.maxGeneration:
+                self.maxGeneration = max(self.generations, default=0)
+            offset = self.ageOffsets.pop(entity.id)
+            if self.discount(self.offsetCounts, offset) and offset == self.oldestOffset:
+                self.oldestOffset = max(self.offsetCounts, default=None)
+
+    @staticmethod
+    def discount(counter, key):
+        '''
+        Removes one key from counter and returns True if it was the last one.
+        '''
+        counter[key] -= 1
+        if counter[key] == 0:
+            del counter[key]
+            return True
+        return False
+
+    def tickEnded(self, simulation):
+        board = simulation.board
+        plants, seeds = self.counts[Plant], self.counts[Seed]
+        if board.plants is not None:
+            plants, seeds = board.plants.plants, board.plants.seeds
+        count = len(self.animals)
+        generation = self.generationTotal
+        oldest = self.oldestOffset + self.ticksEnded if self.oldestOffset is not None else 0
+        if board.bodies is not None:
+            mass, fat = board.bodies.total('mass'), board.bodies.total('fatMassFraction')
+        else:
+            mass = fat = 0
+            for animal in self.animals.values():
+                body = animal.body
+                mass += body.mass
+                fat += body.fatMassFraction
+        diversity = np.nan
+        if simulation.iteration % self.diversityInterval == 0:
+            diversity = self.diversity([animal.brain for animal in self.animals.values()])
+        self.tickSeries.append((
+            simulation.round, simulation.iteration, self.counts[Herbivore], self.counts[Carnivore], plants, seeds,
+            mass / count if count else np.nan, fat / count if count else np.nan, generation / count if count else np.nan,
+            self.maxGeneration, oldest, sum(float(field.sum()) for field in board.scent.fields.values()), diversity,
+        ))
+        self.ticksEnded += 1
+
+    def roundEnded(self, simulation):
+        board = simulation.board
+        template = board.creatureTemplate
+        self.roundSeries.append((simulation.round, simulation.iterationsInRound, board.oldestHerbivore,
+                                 template.generation if template else 0, self.diversity([herbivore.brain for herbivore in board.elite])))
+        self.clear() # the next board announces its entities as it is populated
+
+    def diversity(self, brains):
+        if len(brains) < 2:
+            return 0.0
+        return genetics.diversity(np.stack([brain.neuralNetwork.genes.buffer for brain in brains]))
+
+    def ticks(self):
+        return self.tickSeries.columnsSoFar()
+
+    def rounds(self):
+        return self.roundSeries.columnsSoFar()
+
+    def close(self):
+        '''
+        Writes any buffered rows and waits for the writers to finish.
+        '''
+        self.tickSeries.close()
+        self.roundSeries.close()
@@ -1,14 +1,24 @@
 import numpy as np
 from tools.utilities import sigmoid
+from ecosim.genetics import Genome, layerViews
 
 class NeuralNetwork:
-    def __init__(self):
-        self.inputs = 10
-        self.outputs = 5
-        self.weights = []
-        self.weights.append(2 * np.random.rand(self.inputs, 10) - 1)
+    __slots__ = ('genes',)
+    inputs = 10
+    outputs = 5
+    shapes = ((inputs, 10), (11, outputs)) # one weight matrix per layer, the first row of each weights the bias
+
+    def __init__(self, rng=None, genome=None):
+        '''
+        Uses genome for the weights if given, otherwise draws them from rng.
+        '''
+        if genome is None:
+            rng = rng or np.random.default_rng()
+            genome = Genome(self.shapes)
+            for theta in genome.layers:
+                theta[:] = 2 * rng.random(theta.shape) - 1
+        self.genes = genome
         # self.weights.append(2 * np.random.rand(20, 9) - 1)
-        self.weights.append(2 * np.random.rand(11, self.outputs) - 1)
         # self.weights.append(np.array(
         #     [[-0.13802866,  0.29494864, -0.57660932],
         #     [ 0.83919849,  0.13856122, -0.17898541],
@@ -29,6 +39,29 @@ class NeuralNetwork:
         # ))
 
 
+    @property
+    def weights(self):
+        '''
+        One matrix per layer, as views into self.genes.
+        '''
+        return self.genes.layers
+
+    @weights.setter
+    def weights(self, weights):
+        self.genes = Genome.fromLayers(weights)
+
+    def genome(self):
+        '''
+        Returns a copy of every weight of the network as one flat array.
+        '''
+        return self.genes.buffer.copy()
+
+    def setGenome(self, genome):
+        '''
+        Replaces the weights with the values in genome, a flat array laid out as returned by genome.
+        '''
+        self.genes = Genome(self.genes.shapes, np.array(genome, dtype=np.float64))
+
     def forwardPropagate(self, X):
         X = np.array(X)
         a = np.reshape(X, (1, X.size)) 
@@ -37,4 +70,30 @@ class NeuralNetwork:
             a = np.hstack([a0, a])
             z = np.matmul(a, theta)
             a = sigmoid(z)
-        return a[0]
\ No newline at end of file
+        return a[0]
+
+class NetworkBatch:
+    '''
+    Stacks the weights of many NeuralNetworks with identical layer shapes into one contiguous
+    array per layer, so that the whole population can be propagated in a single call.
+    '''
+    def __init__(self, networks, dtype=np.float64):
+        self.dtype = dtype
+        self.size = len(networks)
+        self.weights = []
+        if self.size == 0:
+            return
+        genomes = np.stack([network.genes.buffer for network in networks]).astype(dtype, copy=False)
+        self.weights = layerViews(genomes, networks[0].genes.shapes)
+
+    def forwardPropagate(self, X):
+        '''
+        X has one row of inputs per network. Returns one row of outputs per network.
+        '''
+        a = np.asarray(X, dtype=self.dtype).reshape(self.size, -1)
+        a0 = np.ones((self.size, 1), dtype=self.dtype)
+        for theta in self.weights:
+            a = np.hstack([a0, a])
+            z = np.matmul(a[:, np.newaxis, :], theta)[:, 0, :]
+            a = sigmoid(z)
+        return a
@@ -0,0 +1,31 @@
+class Observer:
+    '''
+    Receives notifications from a Simulation and its Board. The simulation never depends on an
+    observer being attached, so it can be stepped headlessly in a plain loop. Subclasses override
+    only the hooks they need.
+    '''
+    def attach(self, simulation):
+        '''
+        Called once when the observer is attached to simulation. Entities already on the board
+        have not been announced through addEntity.
+        '''
+        pass
+
+    def addEntity(self, entity):
+        pass
+
+    def moveEntity(self, entity):
+        pass
+
+    def removeEntity(self, entity):
+        pass
+
+    def tickEnded(self, simulation):
+        pass
+
+    def roundEnded(self, simulation):
+        '''
+        Called after the last tick of a round, before the board is replaced.
+        '''
+        pass
+
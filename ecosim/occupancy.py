@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class OccupancyIndex:
+    '''
+    Counts the entities on the board per cell for every class in their class hierarchy, so a
+    Herbivore is counted under Herbivore, Animal, Organism and Entity. Grids have a border of one
+    always-empty cell on each side: the cell at (row, col) is stored at [row + 1, col + 1] and the
+    3x3 neighbourhood of any valid cell is a plain slice.
+    '''
+    # (row, col) offsets into a neighbourhood slice, in the order used by Board direction searches
+    directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+    offsets = [(0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0), (0, 0)]
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.counts = {}
+        self.classes = {}
+        self.valid = np.zeros((rows + 2, cols + 2), dtype=bool)
+        self.valid[1:-1, 1:-1] = True
+
+    def classesOf(self, entity):
+        entityClass = entity.__class__
+        classes = self.classes.get(entityClass)
+        if classes is None:
+            classes = self.classes[entityClass] = [cls for cls in entityClass.__mro__ if cls is not object]
+            for cls in classes:
+                if cls not in self.counts:
+                    self.counts[cls] = np.zeros((self.rows + 2, self.cols + 2), dtype=np.int32)
+        return classes
+
+    def add(self, entity, coords):
+        row, col = coords
+        for cls in self.classesOf(entity):
+            self.counts[cls][row + 1, col + 1] += 1
+
+    def remove(self, entity, coords):
+        row, col = coords
+        for cls in self.classesOf(entity):
+            self.counts[cls][row + 1, col + 1] -= 1
+
+    def count(self, coords, classObject):
+        grid = self.counts.get(classObject)
+        if grid is None:
+            return 0
+        row, col = coords
+        return grid[row + 1, col + 1]
+
+    def contains(self, coords, classObject):
+        return self.count(coords, classObject) > 0
+
+    def neighbourhood(self, coords, classObject):
+        '''
+        Returns a read-only 3x3 view of the counts of classObject centered on coords.
+        '''
+        grid = self.counts.get(classObject)
+        if grid is None:
+            return np.zeros((3, 3), dtype=np.int32)
+        row, col = coords
+        view = grid[row:row + 3, col:col + 3]
+        view.flags.writeable = False
+        return view
+
+    def adjacentDirections(self, coords, classObject, present=True, validOnly=False):
+        '''
+        Returns the directions around coords whose cell contains classObject, or does not contain
+        it if present is False. validOnly excludes directions that lead off the board.
+        '''
+        row, col = coords
+        occupied = self.neighbourhood(coords, classObject) > 0
+        mask = occupied if present else ~occupied
+        if validOnly:
+            mask = mask & self.valid[row:row + 3, col:col + 3]
+        return [direction for direction, (y, x) in zip(self.directions, self.offsets) if mask[y, x]]
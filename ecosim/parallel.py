@@ -0,0 +1,218 @@
+'''
+Runs many independent headless simulations on a process pool:
+
+    python -m ecosim.parallel --seeds 0-63 --rounds 10 --output results.json
+
+With --checkpoint, every run is forked from the same saved world with its own seed.
+'''
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ecosim.simulation import Simulation
+from ecosim.observer import Observer
+from ecosim.checkpoint import loadCheckpoint
+
+
+class RoundResult:
+    def __init__(self, seed, round, duration, wallTime, oldestAge, generation, genome, completed=True, run=None):
+        self.seed = seed
+        self.run = run # number of the task in its experiment, set by ExperimentResults.add
+        self.round = round
+        self.duration = duration # ticks
+        self.wallTime = wallTime # seconds
+        self.oldestAge = oldestAge # age of the longest lived herbivore, which is the template for the next round
+        self.generation = generation # generation of that herbivore
+        self.genome = genome # its brain weights, one array per layer
+        self.completed = completed # False if the run hit its tick limit before the round ended
+
+    def toDict(self):
+        return {
+            'seed': self.seed,
+            'run': self.run,
+            'round': self.round,
+            'duration': self.duration,
+            'wallTime': self.wallTime,
+            'oldestAge': self.oldestAge,
+            'generation': self.generation,
+            'completed': self.completed,
+            'genome': [layer.tolist() for layer in self.genome] if self.genome is not None else None,
+        }
+
+
+class RoundRecorder(Observer):
+    '''
+    Collects a RoundResult at the end of every round of a simulation.
+    '''
+    def __init__(self, seed):
+        self.seed = seed
+        self.results = []
+        self.roundStart = time.perf_counter()
+
+    def roundEnded(self, simulation):
+        self.results.append(self.record(simulation, True))
+        self.roundStart = time.perf_counter()
+
+    def record(self, simulation, completed):
+        template = simulation.board.creatureTemplate
+        genome = [layer.copy() for layer in template.brain.neuralNetwork.weights] if template else None
+        return RoundResult(self.seed, simulation.round, simulation.iterationsInRound, time.perf_counter() - self.roundStart,
+                           simulation.board.oldestHerbivore, template.generation if template else 0, genome, completed)
+
+
+class Task:
+    '''
+    One headless run: config holds keyword arguments for Simulation. If checkpoint is the path of
+    a saved simulation, the run continues from it reseeded with seed and config is not used.
+    '''
+    def __init__(self, seed, rounds=1, maxTicks=10000, config=None, checkpoint=None):
+        self.seed = seed
+        self.rounds = rounds
+        self.maxTicks = maxTicks
+        self.config = config or {}
+        self.checkpoint = checkpoint
+
+
+def runTask(task):
+    '''
+    Runs task until it has completed task.rounds rounds or task.maxTicks ticks and returns its
+    (task, RoundResults) pair. An unfinished round is reported with completed set to False.
+    '''
+    recorder = RoundRecorder(task.seed)
+    if task.checkpoint is not None:
+        simulation = loadCheckpoint(task.checkpoint, observers=[recorder], seed=task.seed)
+    else:
+        simulation = Simulation(seed=task.seed, observers=[recorder], **task.config)
+    ticks = 0
+    while len(recorder.results) < task.rounds and ticks < task.maxTicks:
+        simulation.tick()
+        ticks += 1
+    if len(recorder.results) < task.rounds:
+        recorder.results.append(recorder.record(simulation, False))
+    return task, recorder.results
+
+
+class ExperimentResults:
+    '''
+    The round results of every task in an experiment. Tasks are numbered in the order they are
+    added, and each RoundResult records the number of the task it came from, so runs that share
+    a seed but not a configuration are kept apart.
+    '''
+    def __init__(self):
+        self.rounds = []
+        self.tasks = [] # run -> task
+
+    def add(self, task, results):
+        run = len(self.tasks)
+        self.tasks.append(task)
+        for result in results:
+            result.run = run
+        self.rounds.extend(results)
+
+    @staticmethod
+    def configuration(task):
+        '''
+        Returns what a task was run with: its Simulation config, or the checkpoint it was forked
+        from, whose saved config is used instead.
+        '''
+        return {'checkpoint': task.checkpoint} if task.checkpoint is not None else task.config
+
+    def bestGenomes(self, count=10):
+        '''
+        Returns the RoundResults of the count longest lived herbivores across all runs.
+        '''
+        ranked = [result for result in self.rounds if result.genome is not None]
+        ranked.sort(key=lambda result: result.oldestAge, reverse=True)
+        return ranked[:count]
+
+    def statistics(self, rounds):
+        durations = [result.duration for result in rounds if result.completed]
+        return {
+            'rounds': len(rounds),
+            'completedRounds': len(durations),
+            'meanDuration': statistics.mean(durations) if durations else 0,
+            'medianDuration': statistics.median(durations) if durations else 0,
+            'maxDuration': max(durations, default=0),
+            'maxOldestAge': max((result.oldestAge for result in rounds), default=0),
+            'maxGeneration': max((result.generation for result in rounds), default=0),
+            'wallTime': sum(result.wallTime for result in rounds),
+        }
+
+    def summary(self):
+        '''
+        Returns statistics over every round, and the same statistics for the runs of each
+        distinct configuration, in the order the configurations were first run.
+        '''
+        groups = {} # configuration as JSON -> runs with that configuration
+        for run, task in enumerate(self.tasks):
+            groups.setdefault(json.dumps(self.configuration(task), sort_keys=True, default=str), []).append(run)
+        configurations = []
+        for runs in groups.values():
+            members = set(runs)
+            rounds = [result for result in self.rounds if result.run in members]
+            configurations.append(dict({'config': self.configuration(self.tasks[runs[0]]), 'runs': len(runs)}, **self.statistics(rounds)))
+        summary = dict({'runs': len(self.tasks)}, **self.statistics(self.rounds))
+        summary['configurations'] = configurations
+        return summary
+
+    def toJSON(self, path, genomes=10):
+        best = self.bestGenomes(genomes)
+        report = {
+            'summary': self.summary(),
+            'runs': [{'seed': task.seed, 'config': self.configuration(task)} for task in self.tasks],
+            'rounds': [dict(result.toDict(), genome=None) for result in self.rounds],
+            'best': [result.toDict() for result in best],
+        }
+        with open(path, 'w') as outputFile:
+            json.dump(report, outputFile, indent=1)
+
+
+def runExperiment(tasks, processes=None):
+    '''
+    Runs every task on a pool of processes, one per core by default, and returns their
+    ExperimentResults in task order.
+    '''
+    results = ExperimentResults()
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        for task, rounds in executor.map(runTask, tasks):
+            results.add(task, rounds)
+    return results
+
+
+def parseSeeds(text):
+    seeds = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run headless ecosim rounds in parallel.')
+    parser.add_argument('--seeds', type=parseSeeds, default=list(range(os.cpu_count())), help='e.g. 0-15,20')
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--max-ticks', type=int, default=10000)
+    parser.add_argument('--rows', type=int, default=30)
+    parser.add_argument('--cols', type=int, default=40)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--batch-decisions', action='store_true')
+    parser.add_argument('--plant-layer', action='store_true')
+    parser.add_argument('--checkpoint', help='fork every run from this saved simulation')
+    parser.add_argument('--output', default='misc/parallel_results.json')
+    args = parser.parse_args(argv)
+
+    config = {'rows': args.rows, 'cols': args.cols, 'batchDecisions': args.batch_decisions, 'plantLayer': args.plant_layer}
+    tasks = [Task(seed, args.rounds, args.max_ticks, config, args.checkpoint) for seed in args.seeds]
+    results = runExperiment(tasks, args.processes)
+    results.toJSON(args.output)
+    print(json.dumps(results.summary(), indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+'''
+Keeps the bodies of the animals on a board in population arrays, so that energy expenditure,
+digestion, metabolism and starvation are stepped for every animal at once. Used by boards of a
+Simulation created with batchPhysiology=True.
+'''
+import numpy as np
+
+from ecosim.constants import *
+from ecosim.body import AnimalBody, Stomach
+
+
+class Column:
+    '''
+    An attribute of a pooled body or stomach, stored in the pool array of the same name at the row
+    of its owner.
+    '''
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, owner, ownerClass=None):
+        if owner is None:
+            return self
+        return owner.pool.columns[self.name].item(owner.row)
+
+    def __set__(self, owner, value):
+        owner.pool.columns[self.name][owner.row] = value
+
+
+class PooledStomach:
+    '''
+    A Stomach whose totals live in a BodyPool and whose boluses are a row of its padded bolus arrays.
+    contents is a read-only snapshot of (mass, energyContent) pairs; eat with add.
+    '''
+    __slots__ = ('pool', 'row', 'body')
+    contentsMass = Column('contentsMass')
+    capacityRatio = Column('capacityRatio')
+    digestionRate = Column('digestionRate')
+    capacity = Stomach.capacity
+    capacityRemaining = Stomach.capacityRemaining
+    digestionCapacity = Stomach.digestionCapacity
+    consume = Stomach.consume
+
+    def __init__(self, pool, row, body):
+        self.pool = pool
+        self.row = row
+        self.body = body
+
+    @property
+    def contents(self):
+        return tuple(tuple(bolus) for bolus in self.pool.contentsOf(self.row))
+
+    def add(self, mass, energyContent):
+        self.pool.addBolus(self.row, mass, energyContent)
+
+    def digest(self):
+        rows = np.array([self.row])
+        return self.pool.digest(rows)[0] - self.body.totalEnergyExpenditure
+
+
+class PooledBody:
+    '''
+    An AnimalBody whose state lives in a BodyPool. It has the same attributes and runs the same
+    scalar methods as AnimalBody, so animals use it unchanged between the batched steps.
+    '''
+    __slots__ = ('pool', 'row', 'stomach')
+    mass = Column('mass')
+    massCapacity = Column('massCapacity')
+    fatMassFraction = Column('fatMassFraction')
+    muscleMassFraction = Column('muscleMassFraction')
+    fatStorageFraction = Column('fatStorageFraction')
+    muscleStorageFraction = Column('muscleStorageFraction')
+    totalEnergyExpenditure = Column('totalEnergyExpenditure')
+    satiationThreshold = Column('satiationThreshold')
+    starvationThreshold = Column('starvationThreshold')
+    satiationAmount = Column('satiationAmount')
+    edibleMassFraction = AnimalBody.edibleMassFraction
+    energyContent = AnimalBody.energyContent
+    eat = AnimalBody.eat
+    starved = AnimalBody.starved
+    metabolize = AnimalBody.metabolize
+    canReproduce = AnimalBody.canReproduce
+    baselineEnergyExpenditure = AnimalBody.baselineEnergyExpenditure
+
+    def __init__(self, pool, row):
+        self.pool = pool
+        self.row = row
+        self.stomach = PooledStomach(pool, row, self)
+
+    # the two methods called by every animal every tick read the arrays directly
+    def hungry(self):
+        columns, row = self.pool.columns, self.row
+        return columns['contentsMass'][row] / (columns['mass'][row] * columns['capacityRatio'][row]) < columns['satiationThreshold'][row]
+
+    def actionEnergyExpenditure(self, magnitude):
+        columns, row = self.pool.columns, self.row
+        columns['totalEnergyExpenditure'][row] += 2000 + 80 * magnitude * columns['mass'][row]
+
+
+class BodyPool:
+    '''
+    Population arrays holding one row per animal body: a column per attribute of AnimalBody and
+    its Stomach, and boluses in (capacity, depth) arrays padded with zeros. The rare stomach that
+    holds more than depth boluses spills into a list of its own, which is digested like a plain
+    Stomach, until it has few enough boluses to fit its row again. adopt moves the body of
+    an animal into the pool and gives the animal a PooledBody in its place; release gives it back
+    a plain AnimalBody with the same state, so dead animals kept by the board do not hold a row.
+
+    The batched steps apply the same arithmetic in the same order as the scalar AnimalBody and
+    Stomach methods, so every animal ends up with the same numbers it would have had if its own
+    methods were called at the same point of the tick.
+    '''
+    bodyColumns = ['mass', 'massCapacity', 'fatMassFraction', 'muscleMassFraction', 'fatStorageFraction', 'muscleStorageFraction',
+                   'totalEnergyExpenditure', 'satiationThreshold', 'starvationThreshold', 'satiationAmount']
+    stomachColumns = ['contentsMass', 'capacityRatio', 'digestionRate']
+
+    def __init__(self, capacity=64, depth=8):
+        self.capacity = 0
+        self.depth = depth # boluses a row holds before its stomach spills
+        self.columns = {name: np.zeros(0) for name in self.bodyColumns + self.stomachColumns}
+        self.bolusMass = np.zeros((0, depth))
+        self.bolusEnergy = np.zeros((0, depth))
+        self.boluses = np.zeros(0, dtype=np.intp) # number of boluses in each row
+        self.occupied = np.zeros(0, dtype=bool) # rows holding a body
+        self.active = np.zeros(0, dtype=bool) # rows of the animals that are run in the current tick
+        self.running = np.zeros(0, dtype=np.intp) # the same rows, in run order
+        self.spilled = {} # row -> [mass, energyContent] of each bolus of a stomach that spilled
+        self.owners = []
+        self.free = []
+        self.grow(capacity)
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        pad = lambda array: np.concatenate([array, np.zeros((extra,) + array.shape[1:], dtype=array.dtype)])
+        for name, array in self.columns.items():
+            self.columns[name] = pad(array)
+        self.bolusMass = pad(self.bolusMass)
+        self.bolusEnergy = pad(self.bolusEnergy)
+        self.boluses = pad(self.boluses)
+        self.occupied = pad(self.occupied)
+        self.active = pad(self.active)
+        self.owners += [None] * extra
+        self.free += range(capacity - 1, self.capacity - 1, -1) # lowest rows are handed out first
+        self.capacity = capacity
+
+    def adopt(self, animal):
+        if not self.free:
+            self.grow(2 * self.capacity)
+        row = self.free.pop()
+        body = animal.body
+        for name in self.bodyColumns:
+            self.columns[name][row] = getattr(body, name)
+        for name in self.stomachColumns:
+            self.columns[name][row] = getattr(body.stomach, name)
+        self.clearBoluses(row)
+        for mass, energyContent in body.stomach.contents:
+            self.appendBolus(row, mass, energyContent)
+        self.occupied[row] = True
+        self.active[row] = False # joins the batched steps from the next tick on
+        self.owners[row] = animal
+        animal.body = PooledBody(self, row)
+
+    def release(self, animal):
+        row = animal.body.row
+        body = AnimalBody.__new__(AnimalBody)
+        body.stomach = Stomach(body)
+        for name in self.bodyColumns:
+            setattr(body, name, self.columns[name].item(row))
+        for name in self.stomachColumns:
+            setattr(body.stomach, name, self.columns[name].item(row))
+        body.stomach.contents = self.contentsOf(row)
+        self.spilled.pop(row, None)
+        animal.body = body
+        self.occupied[row] = False
+        self.active[row] = False
+        self.owners[row] = None
+        self.free.append(row)
+
+    def total(self, name):
+        '''
+        Returns the sum of column name over every body in the pool.
+        '''
+        return float(self.columns[name][self.occupied].sum())
+
+    def contentsOf(self, row):
+        '''
+        Returns a new list of the [mass, energyContent] of each bolus in the stomach of row.
+        '''
+        spilled = self.spilled.get(row)
+        if spilled is not None:
+            return [list(bolus) for bolus in spilled]
+        count = self.boluses[row]
+        return [list(bolus) for bolus in zip(self.bolusMass[row, :count].tolist(), self.bolusEnergy[row, :count].tolist())]
+
+    def clearBoluses(self, row):
+        self.boluses[row] = 0
+        self.bolusMass[row] = 0
+        self.bolusEnergy[row] = 0
+
+    def appendBolus(self, row, mass, energyContent):
+        spilled = self.spilled.get(row)
+        if spilled is not None:
+            spilled.append([mass, energyContent])
+            return
+        count = self.boluses[row]
+        if count == self.depth:
+            self.spilled[row] = self.contentsOf(row) + [[mass, energyContent]]
+            self.clearBoluses(row)
+            return
+        self.bolusMass[row, count] = mass
+        self.bolusEnergy[row, count] = energyContent
+        self.boluses[row] = count + 1
+
+    def addBolus(self, row, mass, energyContent):
+        self.appendBolus(row, mass, energyContent)
+        self.columns['contentsMass'][row] += mass
+
+    def startTick(self, animals):
+        '''
+        Marks animals, in run order, as the animals run in this tick and resets their energy
+        expenditure, as AnimalBody.baselineEnergyExpenditure does.
+        '''
+        self.active[:] = False
+        rows = self.running = np.array([animal.body.row for animal in animals], dtype=np.intp)
+        self.active[rows] = True
+        columns = self.columns
+        columns['totalEnergyExpenditure'][rows] = 5500 + 150 * columns['mass'][rows]
+
+    def digest(self, rows):
+        '''
+        Digests the stomachs of rows as Stomach.digest does and returns the energy each gained.
+        Every pass takes one step of the digestion loop for all the stomachs that are still
+        digesting, so the loop runs as many passes as the longest stomach needs. Spilled
+        stomachs are digested one at a time.
+        '''
+        columns = self.columns
+        digestionCapacity = columns['digestionRate'][rows] * columns['mass'][rows]
+        contentsMass = columns['contentsMass'][rows]
+        count = self.boluses[rows]
+        amountDigested = np.zeros(len(rows))
+        energyGained = np.zeros(len(rows))
+        front = np.zeros(len(rows), dtype=np.intp) # bolus at the front of each stomach
+        digesting = (amountDigested < digestionCapacity) & (contentsMass > 0)
+        if self.spilled:
+            for i, row in enumerate(rows.tolist()):
+                if row in self.spilled:
+                    digesting[i] = False
+                    contentsMass[i], energyGained[i] = self.digestSpilled(row, digestionCapacity[i], contentsMass[i])
+        digesting = np.flatnonzero(digesting)
+        while len(digesting):
+            stomachs = rows[digesting]
+            fronts = front[digesting]
+            bolusMass = self.bolusMass[stomachs, fronts]
+            changeInMass = np.minimum(digestionCapacity[digesting] - amountDigested[digesting], bolusMass)
+            bolusMass = bolusMass - changeInMass
+            self.bolusMass[stomachs, fronts] = bolusMass
+            contentsMass[digesting] -= changeInMass
+            popped = bolusMass <= 0
+            front[digesting[popped]] += 1
+            emptied = digesting[popped & (front[digesting] == count[digesting])]
+            contentsMass[emptied] = 0 # drop any rounding error left in the total
+            amountDigested[digesting] += changeInMass
+            energyGained[digesting] += self.bolusEnergy[stomachs, fronts] * changeInMass
+            digesting = digesting[(amountDigested[digesting] < digestionCapacity[digesting]) & (contentsMass[digesting] > 0)]
+        columns['contentsMass'][rows] = contentsMass
+        self.dropDigested(rows, front, count)
+        return energyGained
+
+    def digestSpilled(self, row, digestionCapacity, contentsMass):
+        '''
+        Digests the spilled stomach of row as Stomach.digest does and returns its new contentsMass
+        and the energy gained. The stomach goes back into its row once it fits.
+        '''
+        contents = self.spilled[row]
+        amountDigested = 0
+        energyGained = 0
+        while amountDigested < digestionCapacity and contentsMass > 0:
+            bolus = contents[0]
+            changeInMass = min(digestionCapacity - amountDigested, bolus[0])
+            bolus[0] -= changeInMass
+            contentsMass -= changeInMass
+            if bolus[0] <= 0:
+                contents.pop(0)
+                if len(contents) == 0:
+                    contentsMass = 0 # drop any rounding error left in the total
+            amountDigested += changeInMass
+            energyGained += bolus[1] * changeInMass
+        if len(contents) <= self.depth:
+            del self.spilled[row]
+            for mass, energyContent in contents:
+                self.appendBolus(row, mass, energyContent)
+        return contentsMass, energyGained
+
+    def dropDigested(self, rows, front, count):
+        '''
+        Shifts the boluses left in rows to the start of their row, after the first front of each
+        were digested.
+        '''
+        shifted = front > 0
+        if not shifted.any():
+            return
+        rows, front, count = rows[shifted], front[shifted], count[shifted]
+        slots = np.arange(self.depth)
+        source = np.minimum(front[:, None] + slots, self.depth - 1)
+        kept = slots < (count - front)[:, None]
+        self.bolusMass[rows] = np.where(kept, np.take_along_axis(self.bolusMass[rows], source, axis=1), 0)
+        self.bolusEnergy[rows] = np.where(kept, np.take_along_axis(self.bolusEnergy[rows], source, axis=1), 0)
+        self.boluses[rows] = count - front
+
+    def metabolize(self):
+        '''
+        Digests and metabolizes every animal marked by startTick that is still in the pool, as
+        AnimalBody.metabolize does, and returns the animals that starved in run order.
+        '''
+        rows = self.running[self.active[self.running]]
+        if len(rows) == 0:
+            return []
+        columns = self.columns
+        netEnergy = self.digest(rows) - columns['totalEnergyExpenditure'][rows]
+        mass = columns['mass'][rows]
+        fatMassFraction = columns['fatMassFraction'][rows]
+        muscleMassFraction = columns['muscleMassFraction'][rows]
+
+        # energy is burned from or stored purely as fat if energy is lost or if fully grown
+        asFat = (netEnergy < 0) | (mass >= columns['massCapacity'][rows])
+        fat = np.flatnonzero(asFat)
+        massGained = netEnergy[fat] / BODY_FAT_ENERGY_CONTENT
+        startingFatMass = mass[fat] * fatMassFraction[fat]
+        newMass = mass[fat] + massGained
+        fatMassFraction[fat] = (startingFatMass + massGained) / newMass
+        mass[fat] = newMass
+
+        lean = np.flatnonzero(~asFat)
+        fatStorageFraction = columns['fatStorageFraction'][rows[lean]]
+        muscleStorageFraction = columns['muscleStorageFraction'][rows[lean]]
+        startingFatMass = mass[lean] * fatMassFraction[lean]
+        startingMuscleMass = mass[lean] * muscleMassFraction[lean]
+        massGained = netEnergy[lean] / (fatStorageFraction * BODY_FAT_ENERGY_CONTENT + muscleStorageFraction * BODY_MUSCLE_ENERGY_CONTENT)
+        fatMassGained = massGained * fatStorageFraction
+        muscleMassGained = massGained * muscleStorageFraction
+        newMass = mass[lean] + massGained
+        fatMassFraction[lean] = (startingFatMass + fatMassGained) / newMass
+        muscleMassFraction[lean] = (startingMuscleMass + muscleMassGained) / newMass
+        mass[lean] = newMass
+
+        columns['mass'][rows] = mass
+        columns['fatMassFraction'][rows] = fatMassFraction
+        columns['muscleMassFraction'][rows] = muscleMassFraction
+        starved = rows[fatMassFraction < columns['starvationThreshold'][rows]]
+        return [self.owners[row] for row in starved.tolist()]
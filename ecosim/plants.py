@@ -0,0 +1,138 @@
+import numpy as np
+
+from ecosim.entities import Plant, Seed
+
+
+class PlantLayer:
+    '''
+    Stores every Plant and Seed on a board as arrays with one element per cell, instead of as
+    individual entities. Growth, seed dispersal and sprouting are applied to the whole board at once
+    with the same rules as Plant.simulate and Seed.simulate. Each cell holds at most one plant or
+    seed. Plants and seeds in the layer are not in the board's entity registry; the Board query
+    methods return a Plant or Seed built from the layer, and deleting it clears its cell.
+    '''
+    EMPTY = 0
+    SEED = 1
+    PLANT = 2
+
+    directions = np.array([(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)])
+
+    def __init__(self, rows, cols, rng=None, growthRate=.4, seedChance=.05, seedRange=10,
+                 minDaysToSprout=12, maxDaysToSprout=26, seedDeathChance=.05, sproutMass=10, massCapacity=35):
+        self.rows = rows
+        self.cols = cols
+        self.rng = rng or np.random.default_rng()
+        self.growthRate = growthRate
+        self.seedChance = seedChance
+        self.seedRange = seedRange # maximum distance a seed can travel
+        self.minDaysToSprout = minDaysToSprout
+        self.maxDaysToSprout = maxDaysToSprout
+        self.seedDeathChance = seedDeathChance
+        self.sproutMass = sproutMass
+        self.defaultMassCapacity = massCapacity
+        self.state = np.zeros((rows, cols), dtype=np.int8)
+        self.mass = np.zeros((rows, cols))
+        self.massCapacity = np.zeros((rows, cols))
+        self.generation = np.zeros((rows, cols), dtype=np.int32)
+        self.daysToSprout = np.zeros((rows, cols), dtype=np.int16)
+
+    @property
+    def plants(self):
+        return int(np.count_nonzero(self.state == self.PLANT))
+
+    @property
+    def seeds(self):
+        return int(np.count_nonzero(self.state == self.SEED))
+
+    def addPlant(self, coords, generation=0, mass=1, massCapacity=None):
+        row, col = coords
+        self.state[row, col] = self.PLANT
+        self.mass[row, col] = mass
+        self.massCapacity[row, col] = self.defaultMassCapacity if massCapacity is None else massCapacity
+        self.generation[row, col] = generation
+
+    def addSeed(self, coords, generation=0, daysToSprout=6):
+        row, col = coords
+        self.state[row, col] = self.SEED
+        self.mass[row, col] = 0
+        self.generation[row, col] = generation
+        self.daysToSprout[row, col] = daysToSprout
+
+    def remove(self, coords):
+        row, col = coords
+        self.state[row, col] = self.EMPTY
+        self.mass[row, col] = 0
+
+    def contains(self, coords, classObject):
+        row, col = coords
+        if row < 0 or row >= self.rows or col < 0 or col >= self.cols:
+            return False
+        state = self.state[row, col]
+        if state == self.EMPTY or classObject is None:
+            return False
+        return (state == self.PLANT and issubclass(Plant, classObject)) or (state == self.SEED and issubclass(Seed, classObject))
+
+    def occupied(self, coords):
+        row, col = coords
+        return self.state[row, col] != self.EMPTY
+
+    def entityAt(self, coords):
+        '''
+        Returns a new Plant or Seed with the state of the cell at coords, or None if it is empty.
+        The returned entity is not registered with the board.
+        '''
+        row, col = coords
+        state = self.state[row, col]
+        if state == self.PLANT:
+            return Plant(coords, int(self.generation[row, col]), float(self.mass[row, col]), float(self.massCapacity[row, col]))
+        if state == self.SEED:
+            return Seed(coords, int(self.generation[row, col]), int(self.daysToSprout[row, col]))
+        return None
+
+    def step(self):
+        plants = self.state == self.PLANT
+        seeds = self.state == self.SEED
+        self.spreadSeeds(plants)
+        self.grow(plants)
+        self.sprout(seeds)
+
+    def spreadSeeds(self, plants):
+        '''
+        Each plant has a seedChance of dropping a seed up to seedRange cells away in one of the
+        8 directions. Seeds only land on cells of the board without a plant or seed; when several
+        seeds land on the same cell the first one in row-major order is kept.
+        '''
+        rows, cols = np.nonzero(plants & (self.rng.random(plants.shape) < self.seedChance))
+        if len(rows) == 0:
+            return
+        offsets = self.directions[self.rng.integers(0, len(self.directions), len(rows))]
+        magnitudes = self.rng.integers(1, self.seedRange + 1, len(rows))
+        targetRows = rows + offsets[:, 0] * magnitudes
+        targetCols = cols + offsets[:, 1] * magnitudes
+        valid = (targetRows >= 0) & (targetRows < self.rows) & (targetCols >= 0) & (targetCols < self.cols)
+        rows, cols, targetRows, targetCols = rows[valid], cols[valid], targetRows[valid], targetCols[valid]
+        empty = self.state[targetRows, targetCols] == self.EMPTY
+        rows, cols, targetRows, targetCols = rows[empty], cols[empty], targetRows[empty], targetCols[empty]
+        targets, first = np.unique(targetRows * self.cols + targetCols, return_index=True)
+        targetRows, targetCols = np.divmod(targets, self.cols)
+        self.state[targetRows, targetCols] = self.SEED
+        self.mass[targetRows, targetCols] = 0
+        self.generation[targetRows, targetCols] = self.generation[rows[first], cols[first]] + 1
+        self.daysToSprout[targetRows, targetCols] = self.rng.integers(self.minDaysToSprout, self.maxDaysToSprout + 1, len(targets))
+
+    def grow(self, plants):
+        # mass added increases as plant grows, until massCapacity is reached
+        growing = plants & (self.mass < self.massCapacity)
+        self.mass[growing] += np.minimum(self.massCapacity[growing], self.mass[growing] * self.growthRate)
+
+    def sprout(self, seeds):
+        waiting = seeds & (self.daysToSprout > 0)
+        self.daysToSprout[waiting] -= 1
+        ready = seeds & ~waiting
+        rows, cols = np.nonzero(ready)
+        dies = self.rng.random(len(rows)) < self.seedDeathChance
+        self.state[rows[dies], cols[dies]] = self.EMPTY
+        rows, cols = rows[~dies], cols[~dies]
+        self.state[rows, cols] = self.PLANT
+        self.mass[rows, cols] = self.sproutMass
+        self.massCapacity[rows, cols] = self.defaultMassCapacity
@@ -0,0 +1,134 @@
+import csv
+import json
+import math
+import time
+
+
+class Histogram:
+    '''
+    Counts samples in logarithmically spaced buckets, so memory use does not grow with the number
+    of samples. Percentiles are accurate to within one bucket, growth - 1 relative.
+    '''
+    def __init__(self, smallest=1e-7, growth=1.05, buckets=600):
+        self.smallest = smallest
+        self.logGrowth = math.log(growth)
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0
+        self.min = math.inf
+        self.max = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= self.smallest:
+            index = 0
+        else:
+            index = min(int(math.log(value / self.smallest) / self.logGrowth) + 1, len(self.counts) - 1)
+        self.counts[index] += 1
+
+    def percentile(self, percent):
+        '''
+        Returns the upper bound of the bucket holding the given percentile of the samples.
+        '''
+        if self.count == 0:
+            return 0
+        target = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.smallest * math.exp(index * self.logGrowth), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0,
+            'min': self.min if self.count else 0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class Span:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    '''
+    Records the duration of named spans in one Histogram per name. Durations are in seconds.
+
+        with profiler.span('scent'):
+            board.scent.step()
+    '''
+    enabled = True
+    fields = ['name', 'count', 'total', 'mean', 'min', 'max', 'p50', 'p90', 'p99']
+
+    def __init__(self):
+        self.histograms = {}
+
+    def span(self, name):
+        return Span(self, name)
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(seconds)
+
+    def reset(self):
+        self.histograms.clear()
+
+    def summary(self):
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def toJSON(self, path):
+        with open(path, 'w') as outputFile:
+            json.dump(self.summary(), outputFile, indent=1)
+
+    def toCSV(self, path):
+        with open(path, 'w', newline='') as outputFile:
+            writer = csv.DictWriter(outputFile, self.fields)
+            writer.writeheader()
+            for name, summary in self.summary().items():
+                writer.writerow({'name': name, **summary})
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+class NullProfiler(Profiler):
+    '''
+    A Profiler that records nothing. Used when profiling is disabled; callers timing hot loops
+    should check enabled before reading the clock.
+    '''
+    enabled = False
+    nullSpan = NullSpan()
+
+    def span(self, name):
+        return self.nullSpan
+
+    def record(self, name, seconds):
+        pass
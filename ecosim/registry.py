@@ -0,0 +1,110 @@
+import bisect
+import itertools
+
+from ecosim.entities import Organism
+
+
+class EntityRegistry:
+    '''
+    Holds every entity on a Board keyed by a stable integer id, which is assigned to entity.id the
+    first time the entity is added. Adding, removing and membership checks are O(1).
+
+    The registry is also the run schedule. Organisms are kept in one queue per speed, and iteration
+    visits the queues from the fastest to the slowest, each in the order its entities were added, so
+    runs are deterministic and no sort is needed between ticks. Dormant organisms, and those in
+    sleeping chunks, are taken off their queue with suspend until resume puts them back at its end.
+    Entities that are not organisms are never run and are kept apart, after the dormant ones. Adding
+    an entity schedules it by clearing its processed flag, which die sets again. Iterating while
+    adding or removing entities raises an error; iterate over snapshot() instead.
+    '''
+    def __init__(self, firstId=0):
+        self.entities = {} # id -> entity
+        self.queues = {} # speed -> {id: organism}
+        self.speeds = [] # negated speeds of the queues, ascending, so the fastest queue is first
+        self.queueOf = {} # id -> speed of the queue holding the organism
+        self.dormant = {} # id -> suspended organism
+        self.passive = {} # id -> entity that is not an organism
+        self.nextId = firstId
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return itertools.chain(self.organisms(), self.dormant.values(), self.passive.values())
+
+    def __contains__(self, entity):
+        return entity.id is not None and self.entities.get(entity.id) is entity
+
+    def add(self, entity):
+        '''
+        Adds entity and returns its id. Ids are never reused.
+        '''
+        if entity.id is None:
+            entity.id = self.nextId
+            self.nextId += 1
+        self.entities[entity.id] = entity
+        entity.processed = False
+        if isinstance(entity, Organism):
+            self.enqueue(entity, entity.speed)
+        else:
+            self.passive[entity.id] = entity
+        return entity.id
+
+    def remove(self, entity):
+        del self.entities[entity.id]
+        if entity.id in self.queueOf:
+            self.dequeue(entity)
+        elif entity.id in self.dormant:
+            del self.dormant[entity.id]
+        else:
+            del self.passive[entity.id]
+
+    def enqueue(self, organism, speed):
+        queue = self.queues.get(speed)
+        if queue is None:
+            queue = self.queues[speed] = {}
+            bisect.insort(self.speeds, -speed)
+        queue[organism.id] = organism
+        self.queueOf[organism.id] = speed
+
+    def dequeue(self, organism):
+        speed = self.queueOf.pop(organism.id)
+        queue = self.queues[speed]
+        del queue[organism.id]
+        if len(queue) == 0:
+            del self.queues[speed]
+            self.speeds.remove(-speed)
+
+    def reschedule(self, organism):
+        '''
+        Moves organism to the end of the queue for its current speed. Call after changing speed.
+        '''
+        self.dequeue(organism)
+        self.enqueue(organism, organism.speed)
+
+    def suspend(self, organism):
+        self.dequeue(organism)
+        self.dormant[organism.id] = organism
+
+    def resume(self, organism):
+        del self.dormant[organism.id]
+        self.enqueue(organism, organism.speed)
+
+    def queued(self, organism):
+        return organism.id in self.queueOf
+
+    def organisms(self):
+        '''
+        Iterates over the organisms that are not dormant, in run order.
+        '''
+        queues = self.queues
+        return itertools.chain.from_iterable(queues[-speed].values() for speed in self.speeds)
+
+    def get(self, entityId):
+        return self.entities.get(entityId)
+
+    def ids(self):
+        return [entity.id for entity in self]
+
+    def snapshot(self):
+        return list(self)
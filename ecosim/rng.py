@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+
+class Stream(random.Random):
+    '''
+    A random number stream for one subsystem. Scalar draws use the random.Random methods
+    (randint, uniform, ...) and array draws use self.generator, a numpy Generator. Both are seeded
+    from the same SeedSequence.
+    '''
+    def __init__(self, seedSequence):
+        super().__init__(int.from_bytes(seedSequence.generate_state(4, np.uint32).tobytes(), 'little'))
+        self.generator = np.random.Generator(np.random.PCG64(seedSequence))
+
+    def getState(self):
+        return {'random': self.getstate(), 'generator': self.generator.bit_generator.state}
+
+    def setState(self, state):
+        self.setstate(state['random'])
+        self.generator.bit_generator.state = state['generator']
+
+
+class RandomStreams:
+    '''
+    Independent random number streams for each subsystem, all derived from one seed. Draws made
+    by one subsystem never shift the numbers seen by another, so a run is reproducible from its
+    seed and replacing the implementation of one subsystem leaves the others' draws unchanged.
+    '''
+    names = ['placement', 'movement', 'breeding', 'mutation', 'dispersal']
+
+    def __init__(self, seed=None):
+        seedSequence = np.random.SeedSequence(seed)
+        self.seed = seedSequence.entropy
+        for name, child in zip(self.names, seedSequence.spawn(len(self.names))):
+            setattr(self, name, Stream(child))
+
+    def getState(self):
+        return {name: getattr(self, name).getState() for name in self.names}
+
+    def setState(self, state):
+        for name in self.names:
+            getattr(self, name).setState(state[name])
+
+
+defaultStreams = RandomStreams() # used by entities created without an explicit stream
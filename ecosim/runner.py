@@ -0,0 +1,101 @@
+import threading
+import time
+
+from ecosim.frame import Frame
+
+
+class Runner:
+    '''
+    Steps a Simulation on a background thread and publishes a Frame of the board after each tick.
+    Readers such as the GUI take the latest frame whenever they are ready to draw, so rendering and
+    simulation run at independent rates. Observers of the simulation are called on the worker thread.
+
+        runner = Runner(simulation, interval=.25)
+        runner.start()
+        frame = runner.frame
+    '''
+    def __init__(self, simulation, interval=.25, frameInterval=1 / 60):
+        self.simulation = simulation
+        self.interval = interval # seconds between ticks when not fast-forwarding
+        self.frameInterval = frameInterval # minimum seconds between frames published while fast-forwarding
+        self.paused = False
+        self.fastForward = False
+        self.pendingSteps = 0 # single steps requested while paused
+        self.stopped = False
+        self.ticks = 0
+        self.published = 0
+        self.stale = False # set when the last tick was not published
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.loop, name='simulation', daemon=True)
+        self.frame = self.capture()
+
+    def capture(self):
+        simulation = self.simulation
+        return Frame.fromBoard(simulation.board, simulation.round, simulation.iteration)
+
+    def publish(self):
+        self.frame = self.capture() # replacing the reference is atomic, readers never see a partial frame
+        self.published = time.perf_counter()
+        self.stale = False
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        '''
+        Stops the worker after its current tick, waiting up to timeout seconds, or until it has
+        finished if timeout is None. Returns whether it has stopped, after which the observers of
+        the simulation are no longer called.
+        '''
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def setPaused(self, paused):
+        with self.condition:
+            self.paused = paused
+            self.condition.notify_all()
+
+    def step(self, ticks=1):
+        '''
+        Pauses the simulation and runs ticks more ticks.
+        '''
+        with self.condition:
+            self.paused = True
+            self.pendingSteps += ticks
+            self.condition.notify_all()
+
+    def setFastForward(self, fastForward):
+        '''
+        Runs ticks back to back without waiting for interval while fastForward is set.
+        '''
+        with self.condition:
+            self.fastForward = fastForward
+            self.condition.notify_all()
+
+    def loop(self):
+        while True:
+            with self.condition:
+                if self.paused and self.pendingSteps == 0 and self.stale:
+                    self.publish()
+                while self.paused and self.pendingSteps == 0 and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                stepping = self.paused
+                if stepping:
+                    self.pendingSteps -= 1
+            started = time.perf_counter()
+            self.simulation.tick()
+            self.ticks += 1
+            if stepping or not self.fastForward or time.perf_counter() - self.published >= self.frameInterval:
+                self.publish()
+            else:
+                self.stale = True
+            with self.condition:
+                if not self.fastForward and not self.paused and not self.stopped:
+                    # woken early by any control change
+                    self.condition.wait(max(0, self.interval - (time.perf_counter() - started)))
@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ScentField:
+    '''
+    Stores the scent left on the board as one concentration grid per source class. Scent decays and
+    diffuses to the 8 adjacent cells every tick; both are applied to whole grids at once. Scent that
+    diffuses off the edge of the board is lost. All cells are updated from the same starting grid,
+    so the result does not depend on the order in which cells are visited. Grids are replaced
+    every step, so look them up again after stepping instead of keeping a reference.
+    '''
+    directions = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+    def __init__(self, rows, cols, diffusionRate=.1, decayRate=.1, decayBaseline=5, workers=None, tileRows=256):
+        self.rows = rows
+        self.cols = cols
+        self.workers = workers # threads used to step large grids in tiles, None steps the whole grid at once
+        self.tileRows = tileRows
+        self.executor = None
+        self.spares = {} # the buffer each grid is stepped into, swapped with the grid every tick
+        self.diffusionRate = diffusionRate # the fraction of count that will diffuse to adjacent cells
+        self.decayRate = decayRate
+        self.decayBaseline = decayBaseline # flat amount lost by every scented cell each tick
+        self.fields = {}
+
+    def __getitem__(self, sourceClass):
+        '''
+        Returns the concentration grid for sourceClass, creating an empty one if necessary.
+        '''
+        field = self.fields.get(sourceClass)
+        if field is None:
+            field = self.fields[sourceClass] = np.zeros((self.rows, self.cols))
+        return field
+
+    def emit(self, sourceClass, coords, amount):
+        row, col = coords
+        self[sourceClass][row, col] += amount
+
+    def concentration(self, sourceClass, coords):
+        field = self.fields.get(sourceClass)
+        if field is None:
+            return 0
+        row, col = coords
+        return field[row, col]
+
+    def step(self):
+        for sourceClass, field in self.fields.items():
+            out = self.spares.pop(sourceClass, None)
+            if out is None:
+                out = np.empty_like(field)
+            self.stepField(field, out)
+            self.fields[sourceClass] = out
+            self.spares[sourceClass] = field
+
+    def stepField(self, field, out):
+        '''
+        Writes field after one tick of decay and diffusion to out. With workers, the rows are split
+        into tiles of tileRows rows that are stepped on a thread pool; the result is identical to
+        stepping the whole grid as one tile.
+        '''
+        if self.workers is None or self.rows < 2 * self.tileRows:
+            self.stepTile(field, out, 0, self.rows)
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers)
+        futures = [self.executor.submit(self.stepTile, field, out, start, min(start + self.tileRows, self.rows))
+                   for start in range(0, self.rows, self.tileRows)]
+        for future in futures:
+            future.result()
+
+    def stepTile(self, field, out, start, stop):
+        '''
+        Steps rows start to stop of field into out. The rows just outside the tile are decayed
+        along with it as a halo, because their outflow diffuses into the tile.
+        '''
+        haloStart = max(start - 1, 0)
+        haloStop = min(stop + 1, self.rows)
+        local = field[haloStart:haloStop].copy()
+        self.decay(local)
+        outflow = np.floor(local * self.diffusionRate / len(self.directions))
+        local -= outflow * len(self.directions)
+        tile = local[start - haloStart:stop - haloStart]
+        for dRow, dCol in self.directions:
+            # each cell receives the outflow of the neighbour at (-dRow, -dCol), if it is on the board
+            first = max(start, dRow)
+            last = min(stop, self.rows + dRow)
+            if first >= last:
+                continue
+            targetCols, sourceCols = self.shiftSlices(dCol, self.cols)
+            tile[first - start:last - start, targetCols] += outflow[first - dRow - haloStart:last - dRow - haloStart, sourceCols]
+        out[start:stop] = tile
+
+    def decay(self, field):
+        field -= self.decayBaseline + np.floor(self.decayRate * field)
+        np.maximum(field, 0, out=field)
+
+    def shiftSlices(self, offset, size):
+        '''
+        Returns the target and source slices that move every element of an axis of length size by
+        offset, dropping whatever falls off the edge.
+        '''
+        return slice(max(offset, 0), size + min(offset, 0)), slice(max(-offset, 0), size - max(offset, 0))
@@ -1,66 +1,148 @@
-from random import randint
-import sys
+import time
+
+import numpy as np
 
-from tools.utilities import functionTimer
 from ecosim.entities import *
 from ecosim.board import Board, Cell
-from ecosim.gui import *
+from ecosim.neural_network import NetworkBatch
+from ecosim.rng import RandomStreams
+from ecosim.profiler import NullProfiler
 
 
 class Simulation:
-    def __init__(self, window, waitBetweenRounds=.5):
-        self.board = Board(window)
+    '''
+    Steps a Board one tick at a time. Rendering and recording are done by Observers, so a
+    Simulation without observers can be driven headlessly by calling tick or advance.
+    '''
+    def __init__(self, waitBetweenRounds=.5, observers=None, rows=30, cols=40, batchDecisions=False, brainDtype=np.float64,
+                 plantLayer=False, seed=None, profiler=None, eliteSize=1, scentWorkers=None, chunkSize=None,
+                 batchPhysiology=False, populate=True):
+        self.observers = []
+        self.chunkSize = chunkSize # allocate cells in chunks of this size that sleep while nothing happens in them
+        self.scentWorkers = scentWorkers # threads stepping the scent grids of large boards in tiles
+        self.eliteSize = eliteSize # number of longest lived herbivores whose brains seed the next round
+        self.immigrants = [] # extra template brains for the next round, cleared once it starts
+        self.profiler = profiler or NullProfiler() # pass a Profiler to record the time spent in each phase of tick
+        self.rng = RandomStreams(seed)
+        self.seed = self.rng.seed
+        self.plantLayer = plantLayer # simulate plants and seeds as arrays instead of entities
+        self.batchDecisions = batchDecisions # decide for every animal in one pass at the start of each tick
+        self.batchPhysiology = batchPhysiology # metabolize every animal in one pass after the organisms are run
+        self.brainDtype = brainDtype
+        self.rows = rows
+        self.cols = cols
+        self.board = Board(rows=self.rows, cols=self.cols, observers=self.observers, plantLayer=self.plantLayer, rng=self.rng,
+                           eliteSize=self.eliteSize, scentWorkers=self.scentWorkers, chunkSize=self.chunkSize,
+                           populate=populate, batchPhysiology=self.batchPhysiology)
         self.round = 1
         self.iteration = 1
         self.iterationsInRound = 0
-        self.window = window
         self.waitBetweenRounds = waitBetweenRounds
+        for observer in observers or []:
+            self.attach(observer)
 
-        self.window.createBackground(self.board.rows, self.board.cols)
-        self.addEntities()        
-        self.window.startTimer(self, self.tick)
+    def attach(self, observer):
+        '''
+        Attaches observer to this simulation and to every board it creates from now on.
+        '''
+        self.observers.append(observer)
+        observer.attach(self)
 
-    def addEntities(self):
-        for entity in self.board.entities:
-            self.window.addEntity(entity)
+    def detach(self, observer):
+        self.observers.remove(observer)
 
     def run(self, entity):
         if entity.processed:
             return
         entity.simulate(self.board)
-        self.window.moveEntity(entity)
         entity.getStatus(self.board)
 
-    @functionTimer
-    def tick(self):
-        self.board.queueEntities()
-        particles = []
-        organisms = []
-        for entity in self.board.entities:
-            if isinstance(entity, Particle):
-                particles.append(entity)
-            elif isinstance(entity, Organism):
-                organisms.append(entity)
-        print('particles:', len(particles))
-        print('organisms:', len(organisms))
-        for organism in organisms:
-            self.run(organism)
-        for particle in particles:
-            self.run(particle)
+    def runTimed(self, entity):
+        '''
+        Runs entity and records how long it took under the name of its class.
+        '''
+        if entity.processed:
+            return
+        t0 = time.perf_counter()
+        self.run(entity)
+        self.profiler.record('simulate.' + entity.__class__.__name__, time.perf_counter() - t0)
 
-        self.iteration += 1
-        self.iterationsInRound += 1
+    def decideAll(self, organisms):
+        '''
+        Propagates the brains of every animal in organisms in a single batch. All animals sense the
+        board as it was at the start of the tick.
+        '''
+        animals = [organism for organism in organisms if isinstance(organism, Animal)]
+        if len(animals) == 0:
+            return
+        inputs = Animal.senseAll(animals, self.board).astype(self.brainDtype, copy=False)
+        batch = NetworkBatch([animal.brain.neuralNetwork for animal in animals], self.brainDtype)
+        decisions = np.argmax(batch.forwardPropagate(inputs), axis=1)
+        for animal, decision in zip(animals, decisions.tolist()):
+            animal.decision = decision
+
+    def nextBoard(self):
+        '''
+        Returns the board for the next round, with herbivores bred from the elite of the current
+        board and any immigrants.
+        '''
+        templates = [herbivore.brain for herbivore in self.board.elite] + self.immigrants
+        self.immigrants = []
+        return Board(creatureTemplate=self.board.creatureTemplate, rows=self.rows, cols=self.cols, observers=self.observers,
+                     firstId=self.board.entities.nextId, plantLayer=self.plantLayer, rng=self.rng, templates=templates,
+                     eliteSize=self.eliteSize, scentWorkers=self.scentWorkers, chunkSize=self.chunkSize,
+                     batchPhysiology=self.batchPhysiology)
+
+    def advance(self, ticks=1):
+        '''
+        Runs ticks iterations back to back without waiting between them.
+        '''
+        for i in range(ticks):
+            self.tick()
+
+    def tick(self):
+        profiler = self.profiler
+        with profiler.span('tick'):
+            with profiler.span('partition'):
+                self.board.tick += 1
+                self.board.wakeDue()
+                organisms = list(self.board.entities.organisms()) # those in sleeping chunks are parked off the queues
+                if self.board.bodies is not None:
+                    self.board.bodies.startTick([organism for organism in organisms if isinstance(organism, Animal)])
+            if self.batchDecisions:
+                with profiler.span('decide'):
+                    self.decideAll(organisms)
+            if self.board.plants is not None:
+                with profiler.span('plants'):
+                    self.board.plants.step()
+            with profiler.span('organisms'):
+                if profiler.enabled:
+                    for organism in organisms:
+                        self.runTimed(organism)
+                else:
+                    for organism in organisms:
+                        self.run(organism)
+            if self.board.bodies is not None:
+                with profiler.span('physiology'):
+                    self.board.metabolize()
+            with profiler.span('breeding'):
+                self.board.breedBrains()
+            with profiler.span('scent'):
+                self.board.scent.step()
+            with profiler.span('chunks'):
+                self.board.updateChunks()
 
-        if self.board.herbivores <= 0:
-            with open('misc/results.txt', 'a') as outputFile:
-                outputFile.write('Round: {}, duration: {}\n'.format(self.round, self.iterationsInRound))
-            for entity in self.board.entities:
-                if entity.label:
-                    entity.label.deleteLater()
-            self.board = Board(self.window, self.board.creatureTemplate)
-            self.round += 1
-            self.iterationsInRound = 0
+            self.iteration += 1
+            self.iterationsInRound += 1
 
-        self.board.sortEntities()
-        self.board.raiseLabels()
+            if self.board.herbivores <= 0:
+                with profiler.span('roundReset'):
+                    for observer in self.observers:
+                        observer.roundEnded(self)
+                    self.board = self.nextBoard()
+                    self.round += 1
+                    self.iterationsInRound = 0
 
+            with profiler.span('observers'):
+                for observer in self.observers:
+                    observer.tickEnded(self)
@@ -0,0 +1,81 @@
+class TimerWheel:
+    '''
+    Schedules items to come due on a future tick. Each level is a ring of slots, where a slot of
+    level n spans slots ** n ticks. An item is filed at the level of the highest digit in which
+    its tick differs from the current one, and moves down a level each time the wheel turns past
+    that digit. Scheduling is O(1) and advancing costs O(1) per tick plus O(1) per item per level,
+    however far ahead items are scheduled. Ticks beyond the top level wait in an overflow list.
+
+        wheel = TimerWheel(now=0)
+        wheel.schedule(seed, 15)
+        due = wheel.advance(15) # [seed]
+    '''
+    def __init__(self, now=0, slots=64, levels=3):
+        assert slots & (slots - 1) == 0, 'slots must be a power of two'
+        self.now = now
+        self.slots = slots
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = [[[] for slot in range(slots)] for level in range(levels)]
+        self.overflow = [] # (tick, item) beyond the top level
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def schedule(self, item, tick):
+        '''
+        Files item to come due on tick, which must be after now.
+        '''
+        assert tick > self.now, 'items must be scheduled in the future'
+        self.size += 1
+        self.file(item, tick)
+
+    def file(self, item, tick):
+        level = ((tick ^ self.now).bit_length() - 1) // self.bits if tick != self.now else 0
+        if level >= len(self.levels):
+            self.overflow.append((tick, item))
+        else:
+            self.levels[level][(tick >> (self.bits * level)) & self.mask].append((tick, item))
+
+    def advance(self, tick):
+        '''
+        Turns the wheel to tick and returns the items due on the ticks passed, in the order they
+        came due.
+        '''
+        due = []
+        while self.now < tick:
+            self.now += 1
+            self.cascade()
+            slot = self.levels[0][self.now & self.mask]
+            if slot:
+                due.extend(item for itemTick, item in slot)
+                slot.clear()
+        self.size -= len(due)
+        return due
+
+    def cascade(self):
+        '''
+        Refiles the items of every higher level slot whose span starts at now.
+        '''
+        now = self.now
+        top = len(self.levels)
+        if now & ((1 << (self.bits * top)) - 1) == 0:
+            pending, self.overflow = self.overflow, []
+            for itemTick, item in pending:
+                self.file(item, itemTick)
+        for level in range(top - 1, 0, -1):
+            if now & ((1 << (self.bits * level)) - 1) != 0:
+                continue
+            slots = self.levels[level]
+            index = (now >> (self.bits * level)) & self.mask
+            pending, slots[index] = slots[index], []
+            for itemTick, item in pending:
+                self.file(item, itemTick)
+
+    def items(self):
+        '''
+        Returns every (tick, item) still scheduled.
+        '''
+        scheduled = [entry for level in self.levels for slot in level for entry in slot]
+        return scheduled + self.overflow
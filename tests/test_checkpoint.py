@@ -0,0 +1,45 @@
+import pytest
+
+from ecosim.checkpoint import loadCheckpoint, saveCheckpoint
+from ecosim.simulation import Simulation
+
+
+def fingerprint(simulation):
+    board = simulation.board
+    entities = [(entity.id, entity.name, entity.coords, getattr(entity, 'age', 0), entity.body.mass if hasattr(entity, 'body') else 0)
+                for entity in board.entities]
+    scent = [field.tolist() for name, field in sorted(board.scent.fields.items())]
+    plants = board.plants.mass.tolist() if board.plants is not None else None
+    return simulation.round, simulation.iterationsInRound, board.herbivores, entities, scent, plants
+
+
+@pytest.mark.parametrize('config', [
+    {},
+    {'batchDecisions': True, 'plantLayer': True},
+    {'chunkSize': 8},
+    {'eliteSize': 3, 'batchDecisions': True},
+    {'batchPhysiology': True, 'batchDecisions': True, 'chunkSize': 8},
+])
+def testLoadedCheckpointContinuesLikeTheSavedRun(config, tmp_path):
+    '''
+    Saves a running simulation, runs both it and the loaded copy on, and expects the same entities,
+    scent and plants in the same order.
+    '''
+    path = str(tmp_path / 'run.eco')
+    simulation = Simulation(seed=3, **config)
+    simulation.advance(200)
+    saveCheckpoint(simulation, path)
+    simulation.advance(150)
+    loaded = loadCheckpoint(path)
+    loaded.advance(150)
+    assert fingerprint(loaded) == fingerprint(simulation)
+
+
+def testCheckpointKeepsTheConfiguration(tmp_path):
+    path = str(tmp_path / 'run.eco')
+    simulation = Simulation(seed=5, chunkSize=8, batchPhysiology=True)
+    simulation.advance(20)
+    saveCheckpoint(simulation, path)
+    loaded = loadCheckpoint(path)
+    assert loaded.board.chunkSize == 8 and loaded.board.bodies is not None
+    assert loaded.iteration == simulation.iteration
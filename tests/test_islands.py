@@ -0,0 +1,70 @@
+import queue
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from ecosim.entities import Herbivore
+from ecosim.islands import GenomeBuffer, Migration, runIsland, runIslands
+from ecosim.neural_network import NeuralNetwork
+from ecosim.parallel import Task
+from ecosim.rng import RandomStreams
+
+
+@pytest.fixture
+def buffer():
+    buffer = GenomeBuffer(3, 4, NeuralNetwork().genome().size)
+    yield buffer
+    buffer.close()
+
+
+def elite(count, seed, age=0):
+    rng = RandomStreams(seed).placement
+    herbivores = [Herbivore((0, 0), rng=rng) for i in range(count)]
+    for i, herbivore in enumerate(herbivores):
+        herbivore.age = age + i
+    return herbivores
+
+
+def testBufferIsSharedBetweenAttachments(buffer):
+    attached = GenomeBuffer(*buffer.shape[:2], buffer.shape[2] - 1, name=buffer.name)
+    genomes = np.random.default_rng(0).normal(size=(2, buffer.shape[2] - 1))
+    attached.write(1, [7, 3], genomes)
+    attached.close()
+    version, ages, read = buffer.read(1)
+    assert version == 2
+    assert ages.tolist() == [7, 3] # rows past the elite written stay empty
+    assert np.array_equal(read, genomes)
+    assert buffer.read(0)[1].size == 0
+
+
+def testMigrationReceivesEachPublicationOnce(buffer):
+    migrations = [Migration(island, 3, buffer, 2) for island in range(3)]
+    islands = [SimpleNamespace(round=2, board=SimpleNamespace(elite=elite(3, island, 10 * island)), immigrants=[]) for island in range(3)]
+    migrations[0].roundEnded(islands[0])
+    assert islands[0].immigrants == [] # island 2 has not published yet
+    migrations[2].roundEnded(islands[2])
+    migrations[0].roundEnded(islands[0])
+    received = [brain.neuralNetwork.genome() for brain in islands[0].immigrants]
+    sent = [herbivore.brain.neuralNetwork.genome() for herbivore in islands[2].board.elite]
+    assert len(received) == 3 and all(np.array_equal(a, b) for a, b in zip(received, sent))
+    migrations[0].roundEnded(islands[0])
+    assert len(islands[0].immigrants) == 3 and migrations[0].migrations == 1
+    islands[1].round = 3 # not a migration round
+    migrations[1].roundEnded(islands[1])
+    assert islands[1].immigrants == [] and buffer.read(1)[0] == 0
+
+
+def testFailingIslandReportsToTheParent(buffer):
+    results = queue.Queue()
+    task = Task((0, 1), config={'noSuchOption': True})
+    with pytest.raises(TypeError):
+        runIsland(1, 3, task, buffer.name, (3, 4, buffer.shape[2] - 1), 2, results)
+    island, error = results.get_nowait()
+    assert island == 1 and isinstance(error, TypeError)
+
+
+def testIslandsRunAndMigrate():
+    results = runIslands(islands=2, rounds=3, interval=1, eliteSize=2, maxTicks=3000, config={'rows': 12, 'cols': 12}, timeout=120)
+    assert sorted(results.islands) == [0, 1]
+    assert len(results.rounds) == 6
@@ -0,0 +1,89 @@
+import csv
+
+import numpy as np
+import pytest
+
+from ecosim.entities import Animal, Herbivore
+from ecosim.metrics import ColumnBuffer, ColumnSink, CSVSink, Metrics, Series, loadColumns
+from ecosim.simulation import Simulation
+
+
+def lastTick(metrics):
+    return {column: values[-1] for column, values in metrics.ticks().items()}
+
+
+def testMaxGenerationDropsWhenTheLastOfItDies():
+    metrics = Metrics()
+    simulation = Simulation(seed=0, populate=False, observers=[metrics])
+    board = simulation.board
+    herbivores = []
+    for i, generation in enumerate((0, 2, 5, 5)):
+        herbivore = Herbivore((i, 0), generation, rng=board.rng.placement)
+        board.addEntity(herbivore, (i, 0))
+        herbivores.append(herbivore)
+    metrics.tickEnded(simulation)
+    assert lastTick(metrics)['maxGeneration'] == 5
+    board.deleteEntity(herbivores[2])
+    metrics.tickEnded(simulation)
+    assert lastTick(metrics)['maxGeneration'] == 5 # one of generation 5 is left
+    board.deleteEntity(herbivores[3])
+    metrics.tickEnded(simulation)
+    assert lastTick(metrics)['maxGeneration'] == 2
+    assert lastTick(metrics)['meanGeneration'] == 1
+
+
+@pytest.mark.parametrize('config', [{}, {'batchPhysiology': True}, {'chunkSize': 8}])
+def testIncrementalColumnsMatchTheAnimals(config):
+    '''
+    Runs through rounds and a restart of the metrics, and expects the columns kept from the add and
+    remove notifications to match a scan over the animals on the board after every tick.
+    '''
+    metrics = Metrics()
+    simulation = Simulation(seed=4, observers=[metrics], **config)
+    for tick in range(600):
+        if tick == 300:
+            metrics.attach(simulation) # as when observing a loaded checkpoint
+        simulation.tick()
+        animals = [entity for entity in simulation.board.entities if isinstance(entity, Animal)]
+        row = lastTick(metrics)
+        assert row['oldestAge'] == max((animal.age for animal in animals), default=0)
+        assert row['maxGeneration'] == max((animal.generation for animal in animals), default=0)
+        if animals:
+            assert row['meanMass'] == pytest.approx(np.mean([animal.body.mass for animal in animals]))
+    assert simulation.round > 1
+
+
+def testColumnBufferTakesFilledRows():
+    buffer = ColumnBuffer(['a', 'b'], capacity=3)
+    buffer.append((1, 2))
+    buffer.append((3, 4))
+    assert not buffer.full
+    batch = buffer.take()
+    assert batch['a'].tolist() == [1, 3] and batch['b'].tolist() == [2, 4]
+    assert len(buffer) == 0
+
+
+@pytest.mark.parametrize('keep', [True, False])
+def testSeriesRoundTripsThroughColumnSink(tmp_path, keep):
+    directory = str(tmp_path / 'columns')
+    series = Series(['x', 'y'], ColumnSink(directory, ['x', 'y']), batchSize=4, keep=keep)
+    rows = [(i, i * .5) for i in range(10)]
+    for row in rows:
+        series.append(row)
+    if keep:
+        assert series.columnsSoFar()['y'].tolist() == [y for x, y in rows]
+    series.close()
+    columns = loadColumns(directory)
+    assert columns['x'].tolist() == [x for x, y in rows] and columns['y'].tolist() == [y for x, y in rows]
+
+
+def testSeriesRoundTripsThroughCSVSink(tmp_path):
+    path = str(tmp_path / 'ticks.csv')
+    series = Series(['x', 'y'], CSVSink(path, ['x', 'y']), batchSize=3)
+    for i in range(7):
+        series.append((i, -i))
+    series.close()
+    with open(path, newline='') as csvFile:
+        rows = list(csv.reader(csvFile))
+    assert rows[0] == ['x', 'y']
+    assert [(float(x), float(y)) for x, y in rows[1:]] == [(i, -i) for i in range(7)]
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from ecosim.board import Board
+from ecosim.entities import Animal, Entity, Herbivore, Plant
+
+
+def scatteredBoard(rows, cols, seed):
+    '''
+    Returns a board with plants and herbivores on random cells, some of them moved or deleted, and
+    the entities each cell holds.
+    '''
+    rng = random.Random(seed)
+    board = Board(rows=rows, cols=cols, populate=False)
+    for i in range(rows * cols):
+        coords = (rng.randrange(rows), rng.randrange(cols))
+        board.addEntity(Plant(coords) if rng.random() < .5 else Herbivore(coords, rng=board.rng.placement), coords)
+    entities = list(board.entities)
+    for entity in rng.sample(entities, len(entities) // 3):
+        if rng.random() < .5:
+            board.deleteEntity(entity)
+        else:
+            board.moveEntity(entity, (rng.randrange(rows), rng.randrange(cols)))
+    cells = {}
+    for entity in board.entities:
+        cells.setdefault(entity.coords, []).append(entity)
+    return board, cells
+
+
+@pytest.mark.parametrize('rows, cols', [(1, 1), (1, 5), (4, 5), (6, 3)])
+def testAdjacentDirectionsMatchTheCells(rows, cols):
+    '''
+    Compares the occupancy index with the entities on each cell, including the cells just off the
+    edges of the board, which contain nothing.
+    '''
+    board, cells = scatteredBoard(rows, cols, rows * cols)
+    for row in range(rows):
+        for col in range(cols):
+            for classObject in (Entity, Animal, Herbivore, Plant):
+                def contains(coords):
+                    return any(isinstance(entity, classObject) for entity in cells.get(coords, ()))
+                assert board.occupancy.contains((row, col), classObject) == contains((row, col))
+                around = {direction: board.getCoordsAtDirection((row, col), direction) for direction in board.occupancy.directions}
+                assert board.occupancy.adjacentDirections((row, col), classObject) == \
+                    [direction for direction, coords in around.items() if contains(coords)]
+                assert board.occupancy.adjacentDirections((row, col), classObject, present=False) == \
+                    [direction for direction, coords in around.items() if not contains(coords)]
+                assert board.occupancy.adjacentDirections((row, col), classObject, present=False, validOnly=True) == \
+                    [direction for direction, coords in around.items() if board.validPosition(coords) and not contains(coords)]
+
+
+def testBorderCellsStayEmpty():
+    board, cells = scatteredBoard(4, 5, 0)
+    for grid in board.occupancy.counts.values():
+        assert not grid[0].any() and not grid[-1].any() and not grid[:, 0].any() and not grid[:, -1].any()
+        assert grid.min() >= 0
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from ecosim.constants import *
+from ecosim.entities import Herbivore
+from ecosim.physiology import BodyPool, PooledBody
+from ecosim.rng import RandomStreams
+
+
+def herbivores(count, seed):
+    rng = RandomStreams(seed).placement
+    animals = [Herbivore((0, 0), rng=rng) for i in range(count)]
+    for animal in animals:
+        animal.randomizeMembers(rng)
+    return animals
+
+
+def state(body):
+    stomach = body.stomach
+    values = [getattr(body, name) for name in BodyPool.bodyColumns] + [getattr(stomach, name) for name in BodyPool.stomachColumns]
+    return values, [tuple(bolus) for bolus in stomach.contents]
+
+
+def testMetabolizeMatchesScalarBodies():
+    '''
+    Feeds, works and metabolizes the same animals with plain and pooled bodies, releasing some of
+    the pooled ones on the way, and expects every value to match exactly.
+    '''
+    plain, pooled = herbivores(300, 1), herbivores(300, 1)
+    pool = BodyPool(capacity=16, depth=4)
+    for animal in pooled:
+        pool.adopt(animal)
+    rng = np.random.default_rng(2)
+    alive = list(range(len(plain)))
+    for tick in range(80):
+        magnitudes = rng.uniform(0, 3, len(alive))
+        meals = rng.integers(0, 6, len(alive)) * (rng.random(len(alive)) < .3) # several boluses at once spill small stomachs
+        for i, magnitude in zip(alive, magnitudes.tolist()):
+            plain[i].body.baselineEnergyExpenditure()
+            plain[i].body.actionEnergyExpenditure(magnitude)
+            plain[i].body.metabolize()
+        pool.startTick([pooled[i] for i in alive])
+        for i, magnitude in zip(alive, magnitudes.tolist()):
+            pooled[i].body.actionEnergyExpenditure(magnitude)
+        pool.metabolize()
+        for i, meal in zip(alive, meals.tolist()):
+            for bolus in range(meal):
+                for animal in (plain[i], pooled[i]):
+                    animal.body.stomach.add(animal.body.stomach.capacity * .1, WHEAT_GRASS_ENERGY_CONTENT)
+        for i in alive:
+            assert state(plain[i].body) == state(pooled[i].body)
+        released = rng.choice(alive, 3, replace=False).tolist()
+        for i in released:
+            pool.release(pooled[i])
+            assert not isinstance(pooled[i].body, PooledBody)
+            assert state(plain[i].body) == state(pooled[i].body)
+        alive = [i for i in alive if i not in released]
+    assert len(pool) == len(alive)
+
+
+def testStarvedAnimalsAreReturnedInRunOrder():
+    animals = herbivores(5, 3)
+    pool = BodyPool()
+    for animal in animals:
+        pool.adopt(animal)
+    for i in (3, 1):
+        animals[i].body.fatMassFraction = .01
+    pool.startTick(animals[::-1])
+    assert pool.metabolize() == [animals[3], animals[1]]
+
+
+def testAdoptedAnimalsWaitForTheNextTick():
+    first, second = herbivores(2, 4)
+    pool = BodyPool()
+    pool.adopt(first)
+    pool.startTick([first])
+    pool.adopt(second)
+    second.body.fatMassFraction = .01
+    assert pool.metabolize() == []
+
+
+def testPooledStomachContentsAreReadOnly():
+    animal = herbivores(1, 5)[0]
+    pool = BodyPool()
+    pool.adopt(animal)
+    stomach = animal.body.stomach
+    contentsMass = stomach.contentsMass
+    with pytest.raises(AttributeError):
+        stomach.contents.append((1.0, WHEAT_GRASS_ENERGY_CONTENT))
+    stomach.add(1.0, WHEAT_GRASS_ENERGY_CONTENT)
+    assert stomach.contents[-1] == (1.0, WHEAT_GRASS_ENERGY_CONTENT)
+    assert stomach.contentsMass == contentsMass + 1.0
+
+
+def testOnlyTheOverflowingStomachSpills():
+    animals = herbivores(3, 6)
+    pool = BodyPool(depth=2)
+    for animal in animals:
+        pool.adopt(animal)
+    for i in range(5):
+        animals[0].body.stomach.add(.1, WHEAT_GRASS_ENERGY_CONTENT)
+    assert pool.depth == 2
+    assert list(pool.spilled) == [animals[0].body.row]
+    assert len(animals[0].body.stomach.contents) == 6
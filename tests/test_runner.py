@@ -0,0 +1,66 @@
+import threading
+import time
+
+from ecosim.observer import Observer
+from ecosim.runner import Runner
+from ecosim.simulation import Simulation
+
+
+def waitFor(condition, timeout=10):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, 'timed out'
+        time.sleep(.005)
+
+
+def testPausedRunnerOnlySteps():
+    simulation = Simulation(rows=12, cols=12, seed=0)
+    runner = Runner(simulation, interval=60)
+    first = simulation.iteration
+    runner.setPaused(True)
+    runner.start()
+    runner.step(3)
+    waitFor(lambda: runner.ticks == 3 and runner.frame.iteration == first + 3)
+    time.sleep(.05)
+    assert runner.ticks == 3 and simulation.iteration == first + 3
+    assert runner.stop()
+
+
+def testFastForwardPublishesTheLastTickWhenPaused():
+    simulation = Simulation(rows=12, cols=12, seed=0)
+    runner = Runner(simulation, interval=60, frameInterval=60)
+    runner.start()
+    waitFor(lambda: runner.ticks == 1) # then waits out the interval, until fast-forwarding wakes it
+    runner.setFastForward(True)
+    waitFor(lambda: runner.ticks >= 50)
+    runner.setPaused(True)
+    waitFor(lambda: not runner.stale and runner.frame.iteration == simulation.iteration)
+    ticks = runner.ticks
+    time.sleep(.05)
+    assert runner.ticks == ticks
+    assert runner.stop()
+    assert not runner.thread.is_alive()
+
+
+class SlowObserver(Observer):
+    def __init__(self):
+        self.release = threading.Event()
+        self.ticks = 0
+
+    def tickEnded(self, simulation):
+        self.release.wait()
+        self.ticks += 1
+
+
+def testStopReportsATickStillRunning():
+    observer = SlowObserver()
+    simulation = Simulation(rows=12, cols=12, seed=0, observers=[observer])
+    runner = Runner(simulation, interval=0)
+    runner.start()
+    waitFor(lambda: runner.ticks == 0 and simulation.iteration > 1) # blocked in tickEnded
+    assert not runner.stop(.01)
+    observer.release.set()
+    assert runner.stop()
+    ticks = observer.ticks
+    time.sleep(.05)
+    assert observer.ticks == ticks == 1
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from ecosim.scent import ScentField
+
+
+def randomField(rows, cols, seed):
+    rng = np.random.default_rng(seed)
+    return np.floor(rng.uniform(0, 400, (rows, cols)) * (rng.random((rows, cols)) < .4))
+
+
+def stepCells(scent, field):
+    '''
+    Steps field one cell at a time, the way ScentField describes it.
+    '''
+    decayed = field.copy()
+    scent.decay(decayed)
+    result = decayed.copy()
+    for row in range(scent.rows):
+        for col in range(scent.cols):
+            outflow = np.floor(decayed[row, col] * scent.diffusionRate / len(scent.directions))
+            result[row, col] -= outflow * len(scent.directions)
+            for dRow, dCol in scent.directions:
+                if 0 <= row + dRow < scent.rows and 0 <= col + dCol < scent.cols:
+                    result[row + dRow, col + dCol] += outflow
+    return result
+
+
+def testStepMatchesCellByCellDiffusion():
+    scent = ScentField(9, 7)
+    field = randomField(9, 7, 0)
+    scent[object][:] = field
+    scent.step()
+    assert np.array_equal(scent.fields[object], stepCells(scent, field))
+
+
+@pytest.mark.parametrize('rows, tileRows', [(23, 4), (24, 4), (9, 2), (8, 4)])
+def testTilesMatchTheWholeGrid(rows, tileRows):
+    '''
+    Steps the same grids whole and in tiles on a thread pool, including a last tile shorter than
+    the others, and expects identical results every tick.
+    '''
+    whole = ScentField(rows, 11)
+    tiled = ScentField(rows, 11, workers=2, tileRows=tileRows)
+    for sourceClass in (int, float):
+        whole[sourceClass][:] = tiled[sourceClass][:] = randomField(rows, 11, sourceClass is int)
+    for tick in range(12):
+        whole.step()
+        tiled.step()
+        tiled.emit(int, (tick % rows, 3), 250)
+        whole.emit(int, (tick % rows, 3), 250)
+        for sourceClass in (int, float):
+            assert np.array_equal(whole.fields[sourceClass], tiled.fields[sourceClass])
@@ -0,0 +1,112 @@
+import heapq
+import random
+
+import numpy as np
+
+from ecosim.entities import Plant
+from ecosim.simulation import Simulation
+from ecosim.timers import TimerWheel
+
+
+def testWheelMatchesAHeap():
+    '''
+    Schedules items near and far beyond the top level of a small wheel, advancing it in steps of
+    different lengths, and expects the items a heap of (tick, item) pops on each advance.
+    '''
+    rng = random.Random(0)
+    wheel, heap = TimerWheel(now=0, slots=8, levels=2), []
+    now = count = 0
+    for step in range(2000):
+        for i in range(rng.randint(0, 3)):
+            tick = now + rng.choice((1, rng.randint(1, 8), rng.randint(1, 64), rng.randint(1, 1000)))
+            wheel.schedule(count, tick)
+            heapq.heappush(heap, (tick, count))
+            count += 1
+        now += rng.choice((1, 1, 2, rng.randint(1, 100)))
+        due = wheel.advance(now)
+        expected = []
+        while heap and heap[0][0] <= now:
+            expected.append(heapq.heappop(heap))
+        assert sorted(due) == sorted(item for tick, item in expected)
+        ticks = {item: tick for tick, item in expected}
+        assert [ticks[item] for item in due] == sorted(ticks[item] for item in due) # in the order they came due
+        assert len(wheel) == len(heap)
+    assert sorted(wheel.items()) == sorted(heap)
+
+
+def testWheelReturnsItemsOnTheirTick():
+    wheel = TimerWheel(now=5)
+    wheel.schedule('a', 6)
+    wheel.schedule('b', 5 + 64 ** 3 + 1) # beyond the top level
+    assert wheel.advance(5 + 64 ** 3) == ['a']
+    assert wheel.advance(5 + 64 ** 3 + 1) == ['b']
+    assert len(wheel) == 0
+
+
+def plantedWorld(side, chunkSize, seed=1, cover=70, grown=False):
+    '''
+    Returns a Simulation of a side x side board of plants and nothing else, on cover percent of
+    the cells. Grown plants start at their full mass, so they only spread seeds.
+    '''
+    simulation = Simulation(rows=side, cols=side, seed=seed, populate=False, chunkSize=chunkSize)
+    board = simulation.board
+    rng = board.rng.placement
+    for row in range(side):
+        for col in range(side):
+            if rng.randint(1, 100) <= cover:
+                board.addEntity(Plant((row, col), 0, 35 if grown else rng.randint(10, 25)), (row, col))
+    board.herbivores = 1 # keeps the round going without animals
+    return simulation
+
+
+def testTimersDoNotWakeSleepingChunks():
+    '''
+    Once the plants have filled the board its chunks fall asleep. The timers of their dormant
+    plants keep coming due, which must leave the chunks asleep, and a chunk that is woken
+    afterwards must have no timer left that has already fired.
+    '''
+    simulation = plantedWorld(48, 16)
+    board = simulation.board
+    chunks = board.board.chunks
+    while not all(chunk.asleep for chunk in chunks.values()):
+        assert board.tick < 1000
+        simulation.advance(10)
+    wakes = []
+    wakeChunk = board.wakeChunk
+    board.wakeChunk = lambda chunk: (wakes.append(chunk), wakeChunk(chunk))
+    simulation.advance(200)
+    assert wakes == []
+    assert not list(board.entities.organisms())
+    chunk = next(iter(chunks.values()))
+    wakeChunk(chunk)
+    for organism in chunk.organisms():
+        assert organism.wakeAt is None or organism.wakeAt > board.tick
+        assert organism.wakeAt is not None or board.entities.queued(organism)
+
+
+def testSleepingChunksSpreadAsManySeeds(monkeypatch):
+    '''
+    Counts the seeds spread by a board covered in grown plants, where no seed can land, so the
+    chunks fall asleep and stay asleep until they are all woken at the end. Plants whose timers
+    fired while their chunk slept must spread the seed that was due, so the mean seed count per
+    plant and tick matches that of the same world without chunks, 5%.
+    '''
+    seeds = []
+    disperseSeed = Plant.disperseSeed
+    monkeypatch.setattr(Plant, 'disperseSeed', lambda plant, board: (seeds.append(plant), disperseSeed(plant, board)))
+    rates = {}
+    for chunkSize in (None, 16):
+        counts = []
+        for seed in range(3):
+            simulation = plantedWorld(48, chunkSize, seed, cover=100, grown=True)
+            seeds.clear()
+            simulation.advance(400)
+            board = simulation.board
+            if chunkSize is not None:
+                assert all(chunk.asleep for chunk in board.board.chunks.values())
+                for chunk in board.board.chunks.values():
+                    board.wakeChunk(chunk)
+            counts.append(len(seeds) / (48 * 48 * 400))
+        rates[chunkSize] = np.mean(counts)
+    assert abs(rates[16] / rates[None] - 1) < .02
+    assert abs(rates[None] - .05) < .002
@@ -0,0 +1,402 @@
+'''
+Benchmarks the main simulation code paths with fixed seeds over a range of board sizes and
+population sizes. Results are written as JSON so runs from different versions can be compared:
+
+    python -m tools.benchmark --preset quick --output before.json
+    python -m tools.benchmark --preset quick --output after.json --compare before.json
+'''
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ecosim.simulation import Simulation
+from ecosim.board import Board, Cell
+from ecosim.entities import Animal, Herbivore, Carnivore, Plant, Seed
+from ecosim.plants import PlantLayer
+from ecosim.body import Brain, Nose
+from ecosim.neural_network import NeuralNetwork, NetworkBatch
+from ecosim.rng import RandomStreams
+from ecosim.scent import ScentField
+from ecosim.checkpoint import saveCheckpoint, loadCheckpoint
+from ecosim.physiology import BodyPool
+
+PRESETS = {
+    'quick': {'sizes': [(30, 40), (100, 100)], 'populations': [100, 1000, 10000], 'repeat': 3, 'ticks': 5, 'world': (100000, 10000), 'sparse': 256},
+    'full': {'sizes': [(30, 40), (100, 100), (300, 300), (1000, 1000)], 'populations': [100, 1000, 10000, 100000, 300000], 'repeat': 5, 'ticks': 5,
+             'world': (1000000, 100000), 'sparse': 512},
+}
+
+
+def measure(function, repeat):
+    '''
+    Calls function repeat times and returns the wall time of each call in seconds. Anything the
+    function prints is discarded.
+    '''
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        t1 = time.perf_counter()
+        times.append(t1 - t0)
+    return times
+
+
+def newBoard(rows, cols, seed, plantLayer):
+    return Board(rows=rows, cols=cols, plantLayer=plantLayer, rng=RandomStreams(seed))
+
+
+def largeBoard(rows, cols):
+    # boards with more than a few hundred thousand cells are only practical with the plant layer
+    return rows * cols > 250000
+
+
+def benchmarkTick(rows, cols, seed, repeat, ticks):
+    results = []
+    for mode in ({}, {'chunkSize': 16}, {'batchDecisions': True}, {'batchDecisions': True, 'plantLayer': True},
+                 {'batchDecisions': True, 'batchPhysiology': True}):
+        if largeBoard(rows, cols) and not mode.get('plantLayer'):
+            continue
+        simulation = Simulation(rows=rows, cols=cols, seed=seed, **mode)
+        simulation.advance(2) # warm up
+        times = measure(lambda: simulation.advance(ticks), repeat)
+        results.append(result('Simulation.tick', {'rows': rows, 'cols': cols, **mode}, seed, [t / ticks for t in times], len(simulation.board.entities)))
+    return results
+
+
+def sparseWorld(side, seed, corner=32, **mode):
+    '''
+    Returns a Simulation of a side x side board covered in plant entities, with herbivores only in
+    the corner x corner cells at its top left, so the rest of the board has nothing but plants.
+    '''
+    simulation = Simulation(rows=side, cols=side, seed=seed, populate=False, **mode)
+    board = simulation.board
+    rng = board.rng.placement
+    for row in range(side):
+        for col in range(side):
+            coords = (row, col)
+            if rng.randint(1, 100) <= 70:
+                board.addEntity(Plant(coords, 0, rng.randint(10, 25)), coords)
+            if row < corner and col < corner and rng.randint(1, 100) <= 8:
+                board.addEntity(Herbivore(coords, rng=rng), coords)
+                board.herbivores += 1
+    return simulation
+
+
+def benchmarkSparse(side, seed, repeat, ticks, settle=250):
+    '''
+    Times ticks of a sparse world once its vegetation has filled the board and the chunks without
+    animals have fallen asleep, which takes about settle ticks, with and without chunks, and counts
+    how often a chunk is woken per tick. Dormant plants whose timers fire in a sleeping chunk must
+    not wake it, so the chunked world should wake few chunks and be the faster one.
+    '''
+    results = []
+    for mode in ({}, {'chunkSize': 16}):
+        simulation = sparseWorld(side, seed, **mode)
+        simulation.advance(settle)
+        board = simulation.board
+        wakes = [0]
+        wakeChunk = board.wakeChunk
+        def countingWakeChunk(chunk):
+            wakes[0] += 1
+            wakeChunk(chunk)
+        board.wakeChunk = countingWakeChunk
+        times = measure(lambda: simulation.advance(ticks), repeat)
+        results.append(dict(result('Simulation.tick.sparse', {'rows': side, 'cols': side, **mode}, seed, [t / ticks for t in times], len(board.entities)),
+                            chunkWakes=wakes[0] / (repeat * ticks)))
+    return results
+
+
+def benchmarkPopulate(rows, cols, seed, repeat):
+    plantLayer = largeBoard(rows, cols)
+    times = measure(lambda: newBoard(rows, cols, seed, plantLayer), repeat)
+    board = newBoard(rows, cols, seed, plantLayer)
+    return [result('Board.populateBoard', {'rows': rows, 'cols': cols, 'plantLayer': plantLayer}, seed, times, len(board.entities))]
+
+
+def benchmarkQueries(rows, cols, seed, repeat, count=10000):
+    board = newBoard(rows, cols, seed, largeBoard(rows, cols))
+    rng = np.random.default_rng(seed)
+    coords = list(zip(rng.integers(0, rows, count).tolist(), rng.integers(0, cols, count).tolist()))
+    queries = {
+        'Board.cellContains': lambda: [board.cellContains(c, Animal) for c in coords],
+        'Board.getEntityOfClass': lambda: [board.getEntityOfClass(c, Plant) for c in coords],
+        'Board.getEntitiesOfClass': lambda: [board.getEntitiesOfClass(c, Herbivore) for c in coords],
+        'Board.getEntityOfClasses': lambda: [board.getEntityOfClasses(c, [Plant, Herbivore]) for c in coords],
+        'Board.searchForEmptySpace': lambda: [board.searchForEmptySpace(c) for c in coords],
+    }
+    return [result(name, {'rows': rows, 'cols': cols}, seed, measure(query, repeat), count) for name, query in queries.items()]
+
+
+def benchmarkSmell(rows, cols, seed, repeat):
+    board = newBoard(rows, cols, seed, largeBoard(rows, cols))
+    for entity in board.entities:
+        if isinstance(entity, Animal):
+            entity.emanateScent(board)
+    for i in range(3):
+        board.scent.step()
+    animals = [entity for entity in board.entities if isinstance(entity, Animal)]
+    nose = Nose()
+    times = measure(lambda: [nose.smell(animal, board, Herbivore) for animal in animals], repeat)
+    results = [result('Nose.smell', {'rows': rows, 'cols': cols}, seed, times, len(animals))]
+    times = measure(lambda: Nose.smellAll(animals, board, Herbivore), repeat)
+    results.append(result('Nose.smellAll', {'rows': rows, 'cols': cols}, seed, times, len(animals)))
+    return results
+
+
+def benchmarkDiffusion(rows, cols, seed, repeat):
+    results = []
+    for workers in (None, os.cpu_count()):
+        scent = ScentField(rows, cols, workers=workers)
+        scent[Herbivore][:] = np.random.default_rng(seed).integers(0, 1000, (rows, cols))
+        results.append(result('ScentField.step', {'rows': rows, 'cols': cols, 'workers': workers}, seed, measure(scent.step, repeat), rows * cols))
+    return results
+
+
+def benchmarkCheckpoint(rows, cols, seed, repeat):
+    plantLayer = largeBoard(rows, cols)
+    simulation = Simulation(rows=rows, cols=cols, seed=seed, plantLayer=plantLayer)
+    simulation.advance(2)
+    params = {'rows': rows, 'cols': cols, 'plantLayer': plantLayer}
+    items = len(simulation.board.entities)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.eco')
+        results = [result('saveCheckpoint', params, seed, measure(lambda: saveCheckpoint(simulation, path), repeat), items)]
+        results.append(result('loadCheckpoint', params, seed, measure(lambda: loadCheckpoint(path), repeat), items))
+    return results
+
+
+def benchmarkInference(population, seed, repeat):
+    rng = np.random.default_rng(seed)
+    networks = [NeuralNetwork(rng) for i in range(population)]
+    inputs = rng.random((population, 9)) * 100
+    results = []
+    if population <= 10000:
+        times = measure(lambda: [network.forwardPropagate(x) for network, x in zip(networks, inputs)], repeat)
+        results.append(result('NeuralNetwork.forwardPropagate', {'population': population}, seed, times, population))
+    for dtype in (np.float64, np.float32):
+        times = measure(lambda: NetworkBatch(networks, dtype).forwardPropagate(inputs), repeat)
+        results.append(result('NetworkBatch.forwardPropagate', {'population': population, 'dtype': np.dtype(dtype).name}, seed, times, population))
+    return results
+
+
+def benchmarkMutate(population, seed, repeat):
+    rng = np.random.default_rng(seed)
+    brains = [Brain(rng) for i in range(population)]
+    times = measure(lambda: [brain.mutate(rng) for brain in brains], repeat)
+    results = [result('Brain.mutate', {'population': population}, seed, times, population)]
+    times = measure(lambda: [brain.clone() for brain in brains], repeat)
+    results.append(result('Brain.clone', {'population': population}, seed, times, population))
+    return results
+
+
+def benchmarkMetabolism(population, seed, repeat):
+    '''
+    Metabolizes population herbivores with partly full stomachs one body at a time, then the same
+    herbivores in a BodyPool in one batched step.
+    '''
+    if population > 100000:
+        return []
+    def herbivores():
+        rng = RandomStreams(seed).placement
+        animals = [Herbivore((0, 0), rng=rng) for i in range(population)]
+        for animal in animals:
+            animal.randomizeMembers(rng)
+        return animals
+    animals = herbivores()
+    def metabolizeEach():
+        for animal in animals:
+            animal.body.baselineEnergyExpenditure()
+            animal.body.metabolize()
+    results = [result('AnimalBody.metabolize', {'population': population}, seed, measure(metabolizeEach, repeat), population)]
+    pool = BodyPool()
+    pooled = herbivores()
+    for animal in pooled:
+        pool.adopt(animal)
+    def metabolizeAll():
+        pool.startTick(pooled)
+        pool.metabolize()
+    results.append(result('BodyPool.metabolize', {'population': population}, seed, measure(metabolizeAll, repeat), population))
+    return results
+
+
+def allocated(function):
+    '''
+    Calls function and returns what it returned and the bytes allocated by the call that are
+    still in use, as traced by tracemalloc, which includes numpy arrays.
+    '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = function()
+        return value, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def benchmarkMemory(plants, animals, seed, count=10000):
+    '''
+    Measures the bytes used by one entity of each type and by one Cell, including the objects it
+    owns, then the memory of a world of plants plants and animals herbivores. The world keeps
+    plants in the plant layer and allocates cells in chunks, so its cost grows with the number of
+    animals rather than with the area of the board. On 64-bit CPython 3.11 a Plant entity takes
+    about 290 bytes, a Seed 220, a Herbivore or Carnivore 2.4 kB, of which 1.8 kB is its brain,
+    and a Cell 100; a world of 1,000,000 plants and 100,000 herbivores takes about 330 MB.
+    '''
+    rng = RandomStreams(seed).placement
+    coords = lambda i: divmod(i, 1000) # positions on a 1000 column board
+    factories = [
+        ('Plant', lambda i: Plant(coords(i))),
+        ('Seed', lambda i: Seed(coords(i))),
+        ('Herbivore', lambda i: Herbivore(coords(i), rng=rng)),
+        ('Carnivore', lambda i: Carnivore(coords(i), rng=rng)),
+        ('Cell', lambda i: Cell()),
+    ]
+    results = []
+    for name, factory in factories:
+        t0 = time.perf_counter()
+        objects, size = allocated(lambda: [factory(i) for i in range(count)])
+        elapsed = time.perf_counter() - t0
+        results.append(dict(result('memory.' + name, {}, seed, [elapsed], count), bytes=size, bytesPerItem=size / count))
+
+    def world():
+        side = math.ceil(math.sqrt((plants + animals) * 1.25))
+        board = Board(rows=side, cols=side, plantLayer=True, chunkSize=32, rng=RandomStreams(seed), populate=False)
+        cells = np.random.default_rng(seed).permutation(side * side)
+        layer = board.plants
+        planted = cells[:plants]
+        layer.state.flat[planted] = PlantLayer.PLANT
+        layer.mass.flat[planted] = layer.defaultMassCapacity
+        layer.massCapacity.flat[planted] = layer.defaultMassCapacity
+        for index in cells[plants:plants + animals].tolist():
+            position = divmod(index, side)
+            board.addEntity(Herbivore(position, rng=board.rng.placement), position)
+        board.herbivores = animals
+        return board
+    t0 = time.perf_counter()
+    board, size = allocated(world)
+    elapsed = time.perf_counter() - t0
+    results.append(dict(result('memory.world', {'plants': plants, 'animals': animals}, seed, [elapsed], plants + animals),
+                        bytes=size, bytesPerItem=size / (plants + animals)))
+    return results
+
+
+def result(name, params, seed, times, items):
+    return {
+        'benchmark': name,
+        'params': params,
+        'seed': seed,
+        'items': items,
+        'times': times,
+        'min': min(times),
+        'median': float(np.median(times)),
+        'perItem': float(np.median(times)) / max(items, 1),
+    }
+
+
+def key(entry):
+    return entry['benchmark'] + ' ' + json.dumps(entry['params'], sort_keys=True)
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(sizes, populations, repeat, ticks, seed, only=None, world=None, sparse=None):
+    results = []
+    selected = lambda name: only is None or name in only
+    if world is not None and selected('memory'):
+        results += benchmarkMemory(*world, seed)
+    if sparse is not None and selected('sparse'):
+        results += benchmarkSparse(sparse, seed, repeat, ticks)
+    for rows, cols in sizes:
+        if selected('populate'):
+            results += benchmarkPopulate(rows, cols, seed, repeat)
+        if selected('queries'):
+            results += benchmarkQueries(rows, cols, seed, repeat)
+        if selected('smell'):
+            results += benchmarkSmell(rows, cols, seed, repeat)
+        if selected('diffusion'):
+            results += benchmarkDiffusion(rows, cols, seed, repeat)
+        if selected('tick'):
+            results += benchmarkTick(rows, cols, seed, repeat, ticks)
+        if selected('checkpoint'):
+            results += benchmarkCheckpoint(rows, cols, seed, repeat)
+    for population in populations:
+        if selected('inference'):
+            results += benchmarkInference(population, seed, repeat)
+        if selected('mutate'):
+            results += benchmarkMutate(population, seed, repeat)
+        if selected('metabolism'):
+            results += benchmarkMetabolism(population, seed, repeat)
+    return results
+
+
+def compare(results, baseline):
+    '''
+    Prints the ratio of each median time to the median of the same benchmark in baseline. The
+    table goes to stderr so that it never mixes with the JSON results on stdout.
+    '''
+    previous = {key(entry): entry for entry in baseline['results']}
+    for entry in results:
+        old = previous.get(key(entry))
+        if old:
+            print('{:<80} {:>10.3g}s {:>10.3g}s {:>7.2f}x'.format(key(entry), old['median'], entry['median'], old['median'] / entry['median']), file=sys.stderr)
+
+
+def parseSize(text):
+    rows, cols = text.lower().split('x')
+    return int(rows), int(cols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ecosim engine.')
+    parser.add_argument('--preset', choices=PRESETS, default='quick')
+    parser.add_argument('--sizes', type=lambda text: [parseSize(size) for size in text.split(',')], help='e.g. 30x40,100x100')
+    parser.add_argument('--populations', type=lambda text: [int(n) for n in text.split(',')], help='e.g. 100,1000')
+    parser.add_argument('--repeat', type=int)
+    parser.add_argument('--ticks', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', type=lambda text: text.split(','), help='comma separated subset of: memory,populate,queries,smell,diffusion,tick,sparse,checkpoint,inference,mutate,metabolism')
+    parser.add_argument('--world', type=lambda text: tuple(int(n) for n in text.split(',')), help='plants and animals of the memory benchmark world, e.g. 1000000,100000')
+    parser.add_argument('--sparse', type=int, help='side of the board of the sparse world benchmark')
+    parser.add_argument('--output', help='file to write the JSON results to, defaults to stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against, printed to stderr')
+    args = parser.parse_args(argv)
+    preset = PRESETS[args.preset]
+
+    results = run(args.sizes or preset['sizes'], args.populations or preset['populations'],
+                  args.repeat or preset['repeat'], args.ticks or preset['ticks'], args.seed, args.only, args.world or preset['world'],
+                  args.sparse or preset['sparse'])
+    report = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            json.dump(report, outputFile, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as baselineFile:
+            compare(results, json.load(baselineFile))
+
+
+if __name__ == '__main__':
+    main()
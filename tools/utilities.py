@@ -14,10 +14,12 @@ def functionTimer(func):
 
 def sigmoid(z):
     '''
-    Applies sigmoid function to input matrix elementwise.
+    Applies sigmoid function to input array elementwise, in place.
     '''
-    for row in range(len(z)):
-        for col in range(len(z[0])):
-            z[row][col] = np.clip(z[row][col], -500, 500) # prevents precision overflow
-            z[row][col] =  1 / (1 + np.exp(-z[row][col]))
+    limit = 500 if z.dtype == np.float64 else 80 # prevents precision overflow
+    np.clip(z, -limit, limit, out=z)
+    np.negative(z, out=z)
+    np.exp(z, out=z)
+    z += 1
+    np.reciprocal(z, out=z)
     return z